@@ -1,16 +1,39 @@
 import os
-import json
 import re
 import logging
-import traceback
+import logging.handlers
 import concurrent.futures
+import contextvars
+import atexit
 import time
-from datetime import datetime
+import hashlib
+import sqlite3
+import threading
+import types
+import functools
+import uuid
+import io
+import math
+import operator
+import queue
+import random
+import smtplib
+from array import array
+from datetime import date
 
-from flask import Flask, request, jsonify, render_template
+from flask import Flask, Response, request, jsonify, stream_with_context, url_for
+from flask.json.provider import DefaultJSONProvider
+from flask.logging import default_handler
+from jinja2 import FileSystemBytecodeCache
+from werkzeug.exceptions import RequestEntityTooLarge
 from flask_mail import Mail as FlaskMail, Message
+from flask_caching import Cache
+from flask_compress import Compress
+import httpx
+import orjson
 from openai import OpenAI
 from notion_client import Client
+from notion_client.errors import HTTPResponseError, RequestTimeoutError
 from dotenv import load_dotenv
 
 # -----------------------------------------------------
@@ -19,15 +42,144 @@ from dotenv import load_dotenv
 load_dotenv()
 
 # Flask setup
+class OrjsonProvider(DefaultJSONProvider):
+    """Route request.get_json() and jsonify() through orjson."""
+
+    def _options(self, sort_keys, newline=False):
+        option = orjson.OPT_NON_STR_KEYS
+        if newline:
+            option |= orjson.OPT_APPEND_NEWLINE
+        if sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps(self, obj, **kwargs):
+        option = self._options(kwargs.get("sort_keys", self.sort_keys))
+        return orjson.dumps(obj, default=self.default, option=option).decode()
+
+    def loads(self, s, **kwargs):
+        return orjson.loads(s)
+
+    def response(self, *args, **kwargs):
+        # Hand orjson's bytes straight to the response instead of the base
+        # class's bytes -> str -> f-string -> bytes round trip. Arguments
+        # follow jsonify's documented rules: one value, several as a list,
+        # or keywords as a dict.
+        if args and kwargs:
+            raise TypeError("app.json.response() takes either args or kwargs, not both")
+        obj = args[0] if len(args) == 1 else (args or kwargs or None)
+        body = orjson.dumps(obj, default=self.default, option=self._options(self.sort_keys, newline=True))
+        return self._app.response_class(body, mimetype=self.mimetype)
+
 app = Flask(__name__)
-logging.basicConfig(level=logging.INFO)
+app.json = OrjsonProvider(app)
+# Reject oversized bodies before they're read into memory
+app.config["MAX_CONTENT_LENGTH"] = int(os.getenv("MAX_REQUEST_BYTES", 5 * 1024 * 1024))
+
+# Templates never change at runtime in production: skip the per-render mtime
+# check and let cold workers load compiled bytecode instead of re-parsing.
+JINJA_CACHE_DIR = os.getenv("JINJA_CACHE_DIR", "./cache/jinja")
+os.makedirs(JINJA_CACHE_DIR, exist_ok=True)
+app.jinja_env.auto_reload = app.debug
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache(JINJA_CACHE_DIR)
+# Response/query cache; SimpleCache is per worker process, set CACHE_TYPE
+# (e.g. RedisCache + CACHE_REDIS_URL) to share it across workers
+cache = Cache(app, config={
+    "CACHE_TYPE": os.getenv("CACHE_TYPE", "SimpleCache"),
+    "CACHE_DEFAULT_TIMEOUT": 300,
+    "CACHE_REDIS_URL": os.getenv("CACHE_REDIS_URL"),
+})
+# Compress JSON/HTML over 500 bytes for clients that accept it. SSE
+# (text/event-stream) isn't listed, so streamed deltas are never held back.
+app.config["COMPRESS_MIMETYPES"] = ["application/json", "text/html"]
+app.config["COMPRESS_LEVEL"] = 4
+app.config["COMPRESS_BR_LEVEL"] = 4
+Compress(app)
+# LOG_LEVEL=WARNING in production skips formatting the per-request info lines.
+# Request threads only enqueue records; a listener thread does the stderr
+# writes, so a slow or contended stream never stalls a request.
+_log_queue = queue.SimpleQueue()
+_log_stream = logging.StreamHandler()
+_log_stream.setFormatter(logging.Formatter(logging.BASIC_FORMAT))
+_log_listener = logging.handlers.QueueListener(_log_queue, _log_stream)
+logging.getLogger().setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+logging.getLogger().addHandler(logging.handlers.QueueHandler(_log_queue))
+app.logger.removeHandler(default_handler)
+_log_listener.start()
+atexit.register(_log_listener.stop)
 
 # -----------------------------------------------------
 # Initialize APIs
 # -----------------------------------------------------
-openai_client = OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
-notion = Client(auth=os.getenv("NOTION_API_KEY"))
+# Keep-alive pools so repeat calls reuse TCP + TLS sessions, over HTTP/2 so
+# concurrent sweep updates multiplex on one connection. Notion's SDK rewrites
+# base_url/headers on the client it's given, so each API gets its own.
+HTTP_POOL_LIMITS = httpx.Limits(max_keepalive_connections=32, max_connections=64, keepalive_expiry=60)
+
+# Clients are built on first use, so each gunicorn worker opens its own
+# sockets after the fork instead of inheriting them from the master.
+@functools.lru_cache(maxsize=1)
+def get_openai():
+    return OpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        # The SDK already backs off with jitter on 429/5xx/timeouts (honouring Retry-After)
+        max_retries=int(os.getenv("OPENAI_MAX_RETRIES", 3)),
+        http_client=httpx.Client(http2=True, limits=HTTP_POOL_LIMITS, timeout=30),
+    )
+
+# Failed connection attempts never reach Notion, so retrying them is safe even
+# for pages.create; HTTP-level failures are left to with_retries
+NOTION_CONNECT_RETRIES = int(os.getenv("NOTION_CONNECT_RETRIES", 2))
+# Notion allows ~3 requests/s per integration. The limits are per process, so
+# divide them across gunicorn workers when running more than one.
+NOTION_RATE_PER_SEC = float(os.getenv("NOTION_RATE_PER_SEC", 3))
+NOTION_MAX_CONCURRENT = int(os.getenv("NOTION_MAX_CONCURRENT", 3))
+
+class TokenBucket:
+    """Blocking token bucket: `rate` acquisitions per second, bursting to `capacity`."""
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# Every Notion call goes through notion_call, which paces it here so parallel
+# sweeps queue instead of collecting 429s from the API
+_notion_bucket = TokenBucket(NOTION_RATE_PER_SEC, capacity=max(1, int(NOTION_RATE_PER_SEC)))
+_notion_slots = threading.BoundedSemaphore(NOTION_MAX_CONCURRENT)
+
+@functools.lru_cache(maxsize=1)
+def get_notion():
+    transport = httpx.HTTPTransport(http2=True, limits=HTTP_POOL_LIMITS, retries=NOTION_CONNECT_RETRIES)
+    return Client(auth=os.getenv("NOTION_API_KEY"), client=httpx.Client(transport=transport))
+
 notion_database_id = os.getenv("NOTION_DATABASE_ID")
+# Built once instead of per call. Stub rows with no title or summary are
+# filtered out by Notion, so the sweep never downloads them; they come back
+# once someone fills them in.
+UNSENT_FILTER = {
+    "and": [
+        {"property": "Sent", "checkbox": {"equals": False}},
+        {"property": "Meeting Name", "title": {"is_not_empty": True}},
+        {"property": "Summary", "rich_text": {"is_not_empty": True}},
+    ]
+}
+# Built once instead of per call
+SENT_PROPERTIES = {"Sent": {"checkbox": True}}
 
 # -----------------------------------------------------
 # Mailtrap (Flask-Mail) setup
@@ -42,303 +194,1624 @@ app.config["MAIL_USE_SSL"] = False
 mail = FlaskMail(app)
 MAILTRAP_VERIFIED_SENDER = os.getenv("MAILTRAP_VERIFIED_SENDER")
 
+# Flask-Mail opens (and authenticates) a fresh SMTP session per mail.send();
+# keep a few logged-in sessions around and reuse them instead.
+SMTP_POOL_SIZE = int(os.getenv("SMTP_POOL_SIZE", 4))
+_smtp_pool = queue.LifoQueue(maxsize=SMTP_POOL_SIZE)
+
+# Every SMTP socket operation gives up after this long, so a stalled server
+# fails the send on its own thread instead of needing timeout_wrapper
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", 30))
+
+def _open_smtp():
+    conn = mail.connect()
+    # Flask-Mail's configure_host, plus the socket timeout it doesn't set
+    state = conn.mail
+    smtp_class = smtplib.SMTP_SSL if state.use_ssl else smtplib.SMTP
+    host = smtp_class(state.server, state.port, timeout=SMTP_TIMEOUT)
+    host.set_debuglevel(int(state.debug))
+    if state.use_tls:
+        host.starttls()
+    if state.username and state.password:
+        host.login(state.username, state.password)
+    conn.host = host
+    return conn
+
+def _close_smtp(conn):
+    try:
+        if conn.host is not None:
+            conn.host.quit()
+    except (smtplib.SMTPException, OSError):
+        pass
+
+def _checkout_smtp():
+    try:
+        conn = _smtp_pool.get_nowait()
+    except queue.Empty:
+        return _open_smtp()
+    try:
+        if conn.host is not None:
+            conn.host.noop()
+        return conn
+    except (smtplib.SMTPException, OSError):
+        _close_smtp(conn)
+        return _open_smtp()
+
+# Never hold more SMTP sessions than the pool keeps, so parallel sends can't
+# exceed the provider's connection allowance
+SMTP_MAX_CONCURRENT = int(os.getenv("SMTP_MAX_CONCURRENT", SMTP_POOL_SIZE))
+_smtp_slots = threading.BoundedSemaphore(SMTP_MAX_CONCURRENT)
+
+def send_pooled(msg):
+    """Send a Flask-Mail message over a pooled SMTP session."""
+    with _smtp_slots:
+        _send_pooled(msg)
+
+def _send_pooled(msg):
+    conn = _checkout_smtp()
+    try:
+        # Connection.send needs an app context, which worker threads don't inherit
+        with app.app_context():
+            conn.send(msg)
+    except smtplib.SMTPServerDisconnected:
+        _close_smtp(conn)
+        conn = _open_smtp()
+        try:
+            with app.app_context():
+                conn.send(msg)
+        except Exception:
+            _close_smtp(conn)
+            raise
+    except Exception:
+        _close_smtp(conn)
+        raise
+    try:
+        _smtp_pool.put_nowait(conn)
+    except queue.Full:
+        _close_smtp(conn)
+
 # -----------------------------------------------------
 # Timeout helper
 # -----------------------------------------------------
+# One pool for every timed call: no thread startup per call, and a timed-out
+# caller returns immediately instead of joining a throwaway executor.
+TIMEOUT_POOL_WORKERS = int(os.getenv("TIMEOUT_POOL_WORKERS", 32))
+_timeout_pool = concurrent.futures.ThreadPoolExecutor(
+    max_workers=TIMEOUT_POOL_WORKERS, thread_name_prefix="timeout"
+)
+atexit.register(_timeout_pool.shutdown, wait=False, cancel_futures=True)
+
 def timeout_wrapper(func, *args, timeout=20, **kwargs):
     """Run function with timeout in seconds."""
-    with concurrent.futures.ThreadPoolExecutor() as executor:
-        future = executor.submit(func, *args, **kwargs)
+    # Run in a copy of the caller's context so Flask's app context carries over
+    future = _timeout_pool.submit(contextvars.copy_context().run, func, *args, **kwargs)
+    return _result_within(future, func, timeout)
+
+def _result_within(future, func, timeout):
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        future.cancel()  # Only helps if it never started; a running call finishes on its own
+        raise TimeoutError(f"{func.__name__} exceeded {timeout}s timeout")
+
+def notion_call(method, *args, timeout=20, **kwargs):
+    """
+    timeout_wrapper for Notion SDK calls. Waiting for the rate limit happens
+    before the timeout starts, so a call queued behind others isn't timed
+    out (and retried) while it's still waiting its turn. The slot is held
+    until the request really finishes, even if the caller gave up on it.
+    """
+    _notion_slots.acquire()
+    try:
+        _notion_bucket.acquire()
+        future = _timeout_pool.submit(contextvars.copy_context().run, method, *args, **kwargs)
+    except BaseException:
+        _notion_slots.release()
+        raise
+    future.add_done_callback(lambda _: _notion_slots.release())
+    return _result_within(future, method, timeout)
+
+# -----------------------------------------------------
+# Retries for transient upstream failures
+# -----------------------------------------------------
+# A retried call is far cheaper than the client resubmitting and re-running
+# the whole summarize pipeline.
+RETRY_ATTEMPTS = int(os.getenv("RETRY_ATTEMPTS", 3))
+RETRY_BASE_DELAY = 1.0
+RETRY_MAX_DELAY = 10.0
+TRANSIENT_HTTP_STATUSES = {429, 500, 502, 503, 504}
+
+def is_transient(exc):
+    if isinstance(exc, (TimeoutError, RequestTimeoutError, httpx.TransportError, smtplib.SMTPServerDisconnected)):
+        return True
+    if isinstance(exc, HTTPResponseError):
+        return exc.status in TRANSIENT_HTTP_STATUSES
+    if isinstance(exc, smtplib.SMTPResponseException):
+        return 400 <= exc.smtp_code < 500  # 4xx replies are temporary by definition
+    return False
+
+def retry_after(exc):
+    """Seconds the server asked us to wait (Retry-After), if it said."""
+    headers = getattr(exc, "headers", None)
+    try:
+        return float(headers["retry-after"]) if headers and "retry-after" in headers else None
+    except ValueError:
+        return None  # HTTP-date form; fall back to our own backoff
+
+def is_rate_limited(exc):
+    return isinstance(exc, HTTPResponseError) and exc.status == 429
+
+def is_retryable_send(exc):
+    # A send that timed out may already have been delivered, so never resend it
+    return not isinstance(exc, TimeoutError) and is_transient(exc)
+
+def with_retries(func, *args, retry_if=is_transient, attempts=RETRY_ATTEMPTS, **kwargs):
+    """Call func, retrying failures that retry_if accepts with exponential backoff and jitter."""
+    name = getattr(args[0], "__name__", "call") if func in (timeout_wrapper, notion_call) else func.__name__
+    for attempt in range(1, attempts + 1):
         try:
-            return future.result(timeout=timeout)
-        except concurrent.futures.TimeoutError:
-            raise TimeoutError(f"{func.__name__} exceeded {timeout}s timeout")
-        
+            return func(*args, **kwargs)
+        except Exception as e:
+            if attempt == attempts or not retry_if(e):
+                raise
+            wait = retry_after(e)
+            if wait is not None and wait > RETRY_MAX_DELAY:
+                raise  # Honouring it would hold this thread far past any request timeout
+            delay = random.uniform(0, min(RETRY_MAX_DELAY, RETRY_BASE_DELAY * 2 ** attempt))
+            delay = max(delay, wait or 0)
+            app.logger.warning("[Retry] %s failed (%s), retry %s/%s in %.1fs", name, e, attempt, attempts - 1, delay)
+            time.sleep(delay)
+
+# -----------------------------------------------------
+# Upstream concurrency limit
+# -----------------------------------------------------
+# Caps in-flight OpenAI calls per worker so bursts queue briefly instead of
+# opening unbounded connections and tripping provider rate limits.
+MAX_CONCURRENT_LLM = int(os.getenv("MAX_CONCURRENT_LLM", 8))
+LLM_QUEUE_TIMEOUT = float(os.getenv("LLM_QUEUE_TIMEOUT", 5))
+_llm_slots = threading.BoundedSemaphore(MAX_CONCURRENT_LLM)
+
+class ServiceBusyError(Exception):
+    """Raised when no upstream slot frees up within the queue timeout."""
+
+# -----------------------------------------------------
+# Background work the HTTP response doesn't wait for
+# -----------------------------------------------------
+_background = concurrent.futures.ThreadPoolExecutor(max_workers=4, thread_name_prefix="background")
+
+def mark_page_sent(page_id):
+    """Flip the Sent checkbox on a page; runs on the background executor."""
+    try:
+        with_retries(
+            notion_call,
+            get_notion().pages.update,
+            page_id=page_id,
+            properties=SENT_PROPERTIES,
+            timeout=15,
+        )
+    except Exception as e:
+        app.logger.error(
+            "[Notion] Failed to mark page %s as sent, the next sweep retries the flag: %s",
+            page_id, e,
+        )
+        return
+    remember_flagged(page_id)
+    # Only now can a fresh query see Sent=True; dropping the memo any earlier
+    # lets the next sweep re-cache the page as unsent
+    cache.delete_memoized(query_unsent_pages, notion_database_id)
+
+# Pages whose email went out, kept in the shared SQLite file for
+# EMAILED_PAGE_TTL so a sweep in any worker never emails them again, even
+# from a cached query result that predates the Sent flag. flagged_at is set
+# once the flag is written; until then sweeps retry only the flag. Rows
+# outlive UNSENT_QUERY_TTL by far, and a page whose flag can never be written
+# is re-sent once its row expires rather than stuck.
+EMAILED_PAGE_TTL = int(os.getenv("EMAILED_PAGE_TTL", 86400))
+
+def remember_emailed(page_id):
+    try:
+        with _cache_db() as db:
+            now = time.time()
+            db.execute("DELETE FROM emailed_pages WHERE emailed_at <= ?", (now - EMAILED_PAGE_TTL,))
+            db.execute(
+                "INSERT OR REPLACE INTO emailed_pages (page_id, emailed_at, flagged_at) VALUES (?, ?, NULL)",
+                (page_id, now),
+            )
+    except sqlite3.Error as e:
+        app.logger.warning("[Notion] Could not record page %s as emailed: %s", page_id, e)
+
+def remember_flagged(page_id):
+    try:
+        with _cache_db() as db:
+            db.execute("UPDATE emailed_pages SET flagged_at = ? WHERE page_id = ?", (time.time(), page_id))
+    except sqlite3.Error as e:
+        app.logger.warning("[Notion] Could not record Sent flag for page %s: %s", page_id, e)
+
+def emailed_pages(page_ids):
+    """Map each of page_ids emailed within EMAILED_PAGE_TTL to whether its Sent flag is written."""
+    if not page_ids:
+        return {}
+    try:
+        rows = _cache_db().execute(
+            f"SELECT page_id, flagged_at FROM emailed_pages WHERE emailed_at > ? "
+            f"AND page_id IN ({','.join('?' * len(page_ids))})",
+            (time.time() - EMAILED_PAGE_TTL, *page_ids),
+        ).fetchall()
+    except sqlite3.Error as e:
+        app.logger.warning("[Notion] Emailed-pages lookup failed: %s", e)
+        return {}
+    return {page_id: flagged_at is not None for page_id, flagged_at in rows}
+
 notion_database_url = os.getenv(
     "NOTION_DATABASE_URL",
     "https://www.notion.so/2600089e9046800782ffc62e47b9da86?v=2600089e9046801c8aee000c68f9d671"
 )
 
+# -----------------------------------------------------
+# Summary cache (SQLite, shared by all workers on the host)
+# -----------------------------------------------------
+SUMMARY_MODEL = "gpt-4-turbo"
+# Short transcripts go to the cheaper tier first and escalate only if its output fails validation
+FAST_SUMMARY_MODEL = os.getenv("FAST_SUMMARY_MODEL", "gpt-4o-mini")
+FAST_MODEL_MAX_TOKENS = int(os.getenv("FAST_MODEL_MAX_TOKENS", 4000))
+MIN_SUMMARY_CHARS = 20
+PROMPT_VERSION = "2"  # Bump whenever the prompt changes to invalidate cached summaries
+# Static instructions live in the system message so every request shares the
+# same prompt prefix, which OpenAI can serve from its prompt cache.
+SYSTEM_PROMPT = (
+    "Please analyze the meeting transcript provided by the user and extract:\n"
+    "- A concise summary.\n"
+    "- Action items with owners.\n"
+    "- Key questions unresolved.\n\n"
+    "Format as JSON with keys: summary, action_items, key_questions."
+)
+BATCH_SYSTEM_PROMPT = (
+    "You will receive several meeting transcripts, each introduced by a "
+    "'### Transcript N' heading. For each transcript extract:\n"
+    "- A concise summary.\n"
+    "- Action items with owners.\n"
+    "- Key questions unresolved.\n\n"
+    "Format as JSON with a single key 'summaries': an array with one object per "
+    "transcript, in the same order, each with keys summary, action_items, key_questions."
+)
+# Long transcripts are summarized section by section in parallel, then merged
+MAP_REDUCE_MIN_TOKENS = int(os.getenv("MAP_REDUCE_MIN_TOKENS", 8000))
+MAP_REDUCE_CHUNK_CHARS = 15000  # ~3.7k tokens, so sections route to the fast tier
+MAP_REDUCE_WORKERS = int(os.getenv("MAP_REDUCE_WORKERS", 4))
+# Budget for all sections together; with the merge call this stays inside gunicorn's timeout
+MAP_REDUCE_TIMEOUT = float(os.getenv("MAP_REDUCE_TIMEOUT", 60))
+REDUCE_SYSTEM_PROMPT = (
+    "The user message is a JSON array of partial summaries, one per consecutive "
+    "section of a single meeting transcript. Merge them into one result:\n"
+    "- A concise summary of the whole meeting.\n"
+    "- Action items with owners, without duplicates.\n"
+    "- Key questions still unresolved at the end of the meeting.\n\n"
+    "Format as JSON with keys: summary, action_items, key_questions."
+)
+# Micro-batching of short transcripts (disabled unless a window is configured).
+# Batching puts different callers' transcripts in one prompt, so one user's
+# transcript can steer or garble another's summary (prompt injection, a
+# malformed reply). Only enable it when every caller is trusted.
+SUMMARY_BATCH_WINDOW_MS = int(os.getenv("SUMMARY_BATCH_WINDOW_MS", 0))
+SUMMARY_BATCH_MAX = int(os.getenv("SUMMARY_BATCH_MAX", 5))
+SUMMARY_BATCH_MAX_CHARS = 8000
+SUMMARY_CACHE_PATH = os.getenv("SUMMARY_CACHE_PATH", "./cache/summaries.db")
+SUMMARY_CACHE_TTL = int(os.getenv("SUMMARY_CACHE_TTL", 86400 * 7))
+
+# Semantic cache: reuse a summary when a near-identical transcript was seen before
+SEMANTIC_CACHE_ENABLED = os.getenv("SEMANTIC_CACHE", "1") == "1"
+EMBEDDING_MODEL = "text-embedding-3-small"
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.97))
+SEMANTIC_CACHE_MAX_CHARS = 24000  # Stay under the embedding model's 8k token input limit
+SEMANTIC_CACHE_SCAN_LIMIT = 500
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS summaries (
+    key TEXT PRIMARY KEY, summary_json TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS semantic_summaries (
+    id INTEGER PRIMARY KEY, namespace TEXT NOT NULL, embedding BLOB NOT NULL,
+    summary_json TEXT NOT NULL, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS summary_jobs (
+    id TEXT PRIMARY KEY, status TEXT NOT NULL, result_json TEXT, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS summary_batches (
+    id TEXT PRIMARY KEY, meeting_names TEXT NOT NULL, state TEXT NOT NULL,
+    result_json TEXT, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS emailed_pages (
+    page_id TEXT PRIMARY KEY, emailed_at REAL NOT NULL, flagged_at REAL);
+CREATE TABLE IF NOT EXISTS page_claims (
+    page_id TEXT PRIMARY KEY, claimed_at REAL NOT NULL);
+"""
+_cache_schema_ready = False
+_cache_schema_lock = threading.Lock()
+
+def _greenlet_workers():
+    """True when gevent has patched threading (GUNICORN_WORKER_CLASS=gevent)."""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched("threading")
+
+# Under gevent, threading.local is per greenlet, so every request would open
+# a connection of its own and never close it. Greenlets share one OS thread
+# and sqlite3 calls never switch greenlets, so there the worker shares one
+# connection instead.
+_cache_local = types.SimpleNamespace(conn=None) if _greenlet_workers() else threading.local()
+
+def _cache_db():
+    """Return this thread's SQLite connection; the schema is created once per process."""
+    global _cache_schema_ready
+    conn = getattr(_cache_local, "conn", None)
+    if conn is None:
+        with _cache_schema_lock:
+            if not _cache_schema_ready:
+                os.makedirs(os.path.dirname(SUMMARY_CACHE_PATH) or ".", exist_ok=True)
+                setup = sqlite3.connect(SUMMARY_CACHE_PATH, timeout=5)
+                try:
+                    setup.executescript(_CACHE_SCHEMA)
+                finally:
+                    setup.close()
+                _cache_schema_ready = True
+        conn = sqlite3.connect(SUMMARY_CACHE_PATH, timeout=5)
+        _cache_local.conn = conn
+    return conn
+
+def summary_models(transcript):
+    """
+    The models whose output can become this transcript's summary: the tier
+    it's routed to first (the section tier under map-reduce) and the full
+    model it escalates to or merges on. Both cache layers key on this, so
+    changing either model misses the entries the old one wrote.
+    """
+    first = choose_model(transcript[:MAP_REDUCE_CHUNK_CHARS] if needs_map_reduce(transcript) else transcript)
+    return first if first == SUMMARY_MODEL else f"{first}+{SUMMARY_MODEL}"
+
+def summary_cache_key(transcript):
+    # blake2b hashes long transcripts faster than sha256; 128 bits is plenty for a cache key
+    digest = hashlib.blake2b(transcript.encode(), digest_size=16).hexdigest()
+    return f"{summary_models(transcript)}:{PROMPT_VERSION}:{digest}"
+
+def cache_get(key):
+    try:
+        row = _cache_db().execute(
+            "SELECT summary_json FROM summaries WHERE key = ? AND expires_at > ?",
+            (key, time.time()),
+        ).fetchone()
+    except sqlite3.Error as e:
+        app.logger.warning("[Cache] Lookup failed: %s", e)
+        return None
+    return orjson.loads(row[0]) if row else None
+
+def cache_set(key, summary_data):
+    try:
+        conn = _cache_db()
+        with conn:
+            now = time.time()
+            conn.execute("DELETE FROM summaries WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT OR REPLACE INTO summaries (key, summary_json, expires_at) VALUES (?, ?, ?)",
+                (key, orjson.dumps(summary_data).decode(), now + SUMMARY_CACHE_TTL),
+            )
+    except sqlite3.Error as e:
+        app.logger.warning("[Cache] Store failed: %s", e)
+
+def semantic_namespace(transcript):
+    return f"{summary_models(transcript)}|{PROMPT_VERSION}"
+
+def embed_transcript(transcript):
+    """
+    Return a unit-length embedding for the transcript, or None if it can't be embedded.
+    Transcripts longer than the embedding input limit are skipped rather than
+    truncated, since a shared prefix would otherwise look like a match.
+    """
+    if not SEMANTIC_CACHE_ENABLED or len(transcript) > SEMANTIC_CACHE_MAX_CHARS:
+        return None
+    try:
+        response = timeout_wrapper(
+            get_openai().embeddings.create,
+            model=EMBEDDING_MODEL,
+            input=transcript,
+            timeout=10,
+        )
+    except Exception as e:
+        app.logger.warning("[Cache] Embedding failed, skipping semantic cache: %s", e)
+        return None
+    vector = response.data[0].embedding
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return array("f", (v / norm for v in vector))
+
+def semantic_lookup(embedding, namespace):
+    """Return the cached summary of the most similar transcript above the threshold."""
+    try:
+        rows = _cache_db().execute(
+            "SELECT embedding, summary_json FROM semantic_summaries "
+            "WHERE namespace = ? AND expires_at > ? ORDER BY id DESC LIMIT ?",
+            (namespace, time.time(), SEMANTIC_CACHE_SCAN_LIMIT),
+        ).fetchall()
+    except sqlite3.Error as e:
+        app.logger.warning("[Cache] Semantic lookup failed: %s", e)
+        return None
+
+    best_score, best_json = 0.0, None
+    for blob, summary_json in rows:
+        candidate = array("f")
+        candidate.frombytes(blob)
+        score = sum(map(operator.mul, embedding, candidate))
+        if score > best_score:
+            best_score, best_json = score, summary_json
+
+    if best_json is not None and best_score >= SEMANTIC_CACHE_THRESHOLD:
+        app.logger.info("[Cache] Semantic hit (similarity=%.4f)", best_score)
+        return orjson.loads(best_json)
+    return None
+
+def semantic_store(embedding, summary_data, namespace):
+    try:
+        conn = _cache_db()
+        with conn:
+            now = time.time()
+            conn.execute("DELETE FROM semantic_summaries WHERE expires_at <= ?", (now,))
+            conn.execute(
+                "INSERT INTO semantic_summaries (namespace, embedding, summary_json, expires_at) "
+                "VALUES (?, ?, ?, ?)",
+                (
+                    namespace,
+                    embedding.tobytes(),
+                    orjson.dumps(summary_data).decode(),
+                    now + SUMMARY_CACHE_TTL,
+                ),
+            )
+    except sqlite3.Error as e:
+        app.logger.warning("[Cache] Semantic store failed: %s", e)
+
 # -----------------------------------------------------
 # Helpers
 # -----------------------------------------------------
+_JSON_BLOCK_RE = re.compile(r"```(?:json)?\s*(.*?)\s*```", re.DOTALL)
+
 def extract_json_from_markdown(text):
-    pattern = r"```(?:json)?\s*([\s\S]*?)\s*```"
-    matches = re.findall(pattern, text)
-    return matches[0].strip() if matches else text
+    match = _JSON_BLOCK_RE.search(text)
+    return match.group(1).strip() if match else text
 
 def format_for_notion(data):
-    if isinstance(data, list):
-        if data and isinstance(data[0], dict) and "action" in data[0]:
-            return "\n".join(
-                f"• {item.get('action', '')} (Owner: {item.get('owner', '')})" if item.get("owner")
-                else f"• {item.get('action', '')}"
-                for item in data
-            ).strip()
-        elif data and isinstance(data[0], str):
-            return "\n".join([f"• {q}" for q in data])
-        return "\n".join([f"• {str(i)}" for i in data])
-    elif isinstance(data, dict):
-        return json.dumps(data, indent=2)
-    return str(data)
+    return _NOTION_FORMATTERS.get(type(data), str)(data)
+
+def _format_list(items):
+    return "\n".join(bullet_lines(items)).strip()
+
+def _format_dict(data):
+    return orjson.dumps(data, option=orjson.OPT_INDENT_2).decode()
+
+def bullet_lines(items):
+    """One '• ' line per list entry, with the owner appended for action items."""
+    if not items:
+        return []
+    first = items[0]
+    if type(first) is str:
+        return _string_bullets(items)
+    if type(first) is dict and "action" in first:
+        return _action_bullets(items)
+    return _generic_bullets(items)
+
+def _action_bullets(items):
+    lines = []
+    for item in items:
+        action = item.get("action", "")
+        owner = item.get("owner")
+        lines.append(f"• {action} (Owner: {owner})" if owner else f"• {action}")
+    return lines
+
+def _string_bullets(items):
+    return [f"• {q}" for q in items]
+
+def _generic_bullets(items):
+    return [f"• {str(i)}" for i in items]
+
+# Parsed model JSON only ever yields these exact types, so one dict lookup
+# replaces the isinstance ladder; anything else falls back to str()
+_NOTION_FORMATTERS = {list: _format_list, dict: _format_dict, str: str}
 
 def safe_get_text(prop, key_type="rich_text", page_id="unknown", field_name="unknown"):
     """
     Safely extract text from Notion properties - updated for rich_text
     """
+    if not prop:
+        app.logger.warning("[Notion] Missing entire property '%s' on page %s", field_name, page_id)
+        return ""
     try:
-        if not prop:
-            app.logger.warning(f"[Notion] Missing entire property '{field_name}' on page {page_id}")
-            return ""
-        
-        # Handle both rich_text and text types
-        if key_type in prop:
-            if prop[key_type]:
+        values = prop.get(key_type)
+        if values:
+            if key_type in ("rich_text", "title"):
                 # Extract text content from the first element
-                if key_type == "rich_text":
-                    return prop[key_type][0].get("text", {}).get("content", "")
-                elif key_type == "title":
-                    return prop[key_type][0].get("text", {}).get("content", "")
-                elif key_type == "checkbox":
-                    return str(prop[key_type])
-            else:
-                app.logger.warning(f"[Notion] Empty '{field_name}' (type={key_type}) on page {page_id}")
+                return values[0].get("text", {}).get("content", "")
+            elif key_type == "checkbox":
+                return str(values)
+        elif key_type in prop:
+            app.logger.warning("[Notion] Empty '%s' (type=%s) on page %s", field_name, key_type, page_id)
         else:
-            app.logger.warning(f"[Notion] Missing key type '{key_type}' for field '{field_name}'. Actual keys: {list(prop.keys())}")
-    except Exception as e:
-        app.logger.error(f"[Notion] Error extracting '{field_name}' on page {page_id}: {e}")
+            app.logger.warning(
+                "[Notion] Missing key type '%s' for field '%s'. Actual keys: %s",
+                key_type, field_name, prop.keys(),  # A view, so nothing is built unless the record is emitted
+            )
+    except (AttributeError, IndexError, KeyError, TypeError) as e:
+        app.logger.error("[Notion] Error extracting '%s' on page %s: %s", field_name, page_id, e)
     return ""
 
-def send_email_via_mailtrap(meeting_name, summary, action_items, key_questions, page_url):
-    try:
-        # Include both links
-        html_content = f"""
-        <h2>Meeting Summary: {meeting_name}</h2>
-        <p><strong>Summary:</strong><br>{summary.replace(chr(10), '<br>')}</p>
-        <p><strong>Action Items:</strong></p>
-        <ul>{"".join([f'<li>{i}</li>' for i in action_items.split(chr(10)) if i.strip()])}</ul>
-        <p><strong>Key Questions:</strong></p>
-        <ul>{"".join([f'<li>{q}</li>' for q in key_questions.split(chr(10)) if q.strip()])}</ul>
-        <p><strong>View Page in Notion:</strong> <a href="{page_url}">{page_url}</a></p>
-        <p><strong>View Database in Notion:</strong> <a href="{notion_database_url}">{notion_database_url}</a></p>
-        """
-
-        plain_text_content = f"""
-        Meeting Summary: {meeting_name}
-
-        Summary:
-        {summary}
-
-        Action Items:
-        {action_items}
+# Compiled once at import; the .html template is autoescaped, so meeting
+# content from Notion or the model can't inject markup into the email.
+EMAIL_HTML_TEMPLATE = app.jinja_env.get_template("summary_email.html")
+EMAIL_TEXT_TEMPLATE = app.jinja_env.get_template("summary_email.txt")
+EMAIL_SENDER = (MAILTRAP_VERIFIED_SENDER, "AI Meeting Summarizer")
+EMAIL_RECIPIENTS = (MAILTRAP_VERIFIED_SENDER,)  # Mailtrap trial restriction
+NL = "\n"
 
-        Key Questions:
-        {key_questions}
+def _email_lines(value):
+    # Summaries from /summarize arrive as bullet lists; pages read back from
+    # Notion only have the stored text, so split that once here.
+    if isinstance(value, list):
+        return value
+    return [line for line in value.splitlines() if line.strip()]
 
-        View Page in Notion: {page_url}
-        View Database in Notion: {notion_database_url}
-        """
+def send_email_via_mailtrap(meeting_name, summary, action_items, key_questions, page_url):
+    """action_items / key_questions may be bullet-line lists or stored Notion text."""
+    try:
+        action_items = _email_lines(action_items)
+        key_questions = _email_lines(key_questions)
+        html_content = EMAIL_HTML_TEMPLATE.render(
+            meeting_name=meeting_name,
+            summary_lines=summary.split(NL),
+            action_items=action_items,
+            key_questions=key_questions,
+            page_url=page_url,
+            database_url=notion_database_url,
+        )
+        plain_text_content = EMAIL_TEXT_TEMPLATE.render(
+            meeting_name=meeting_name,
+            summary=summary,
+            action_items=action_items,
+            key_questions=key_questions,
+            page_url=page_url,
+            database_url=notion_database_url,
+        )
 
         msg = Message(
             subject=f"Meeting Summary: {meeting_name}",
-            sender=(MAILTRAP_VERIFIED_SENDER, "AI Meeting Summarizer"),
-            recipients=[MAILTRAP_VERIFIED_SENDER],  # Mailtrap trial restriction
+            sender=EMAIL_SENDER,
+            recipients=list(EMAIL_RECIPIENTS),  # Message keeps and may append to the list
         )
         msg.body = plain_text_content
         msg.html = html_content
 
-        # Increase timeout and add retry logic
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                timeout_wrapper(mail.send, msg, timeout=45)  # Increased timeout
-                return True, "Email sent successfully via Mailtrap!"
-            except TimeoutError:
-                if attempt < max_retries - 1:
-                    app.logger.warning(f"Mailtrap timeout, retry {attempt + 1}/{max_retries}")
-                    time.sleep(5)  # Wait before retry
-                else:
-                    raise
+        with_retries(send_pooled, msg, retry_if=is_retryable_send)
+        return True, "Email sent successfully via Mailtrap!"
     except Exception as e:
-        app.logger.error(f"Mailtrap send failed after {max_retries} attempts: {e}")
+        app.logger.error("Mailtrap send failed: %s", e)
         return False, f"Failed to send email: {str(e)}"
 
+def parse_summary_content(ai_content):
+    """
+    Parse the model's JSON reply. JSON mode makes the direct parse the normal
+    path; the fence-stripping fallback only runs on malformed output.
+    """
+    try:
+        data = orjson.loads(ai_content)
+    except orjson.JSONDecodeError:
+        try:
+            data = orjson.loads(extract_json_from_markdown(ai_content))
+        except orjson.JSONDecodeError:
+            return None
+    return data if isinstance(data, dict) else None
+
+def is_valid_summary(data):
+    """Check a parsed reply has the expected keys and a non-trivial summary."""
+    if not isinstance(data, dict):
+        return False
+    summary = data.get("summary")
+    if not isinstance(summary, str) or len(summary.strip()) < MIN_SUMMARY_CHARS:
+        return False
+    return all(isinstance(data.get(k), (list, str)) for k in ("action_items", "key_questions"))
+
+class JsonEndScanner:
+    """Tracks brace depth across streamed text, ignoring braces inside strings."""
+
+    def __init__(self):
+        self.depth = 0
+        self.in_string = False
+        self.escaped = False
+
+    def feed(self, text):
+        """Return the index just past the top-level object's closing brace, or -1."""
+        for i, ch in enumerate(text):
+            if self.in_string:
+                if self.escaped:
+                    self.escaped = False
+                elif ch == "\\":
+                    self.escaped = True
+                elif ch == '"':
+                    self.in_string = False
+            elif ch == '"':
+                self.in_string = True
+            elif ch == "{":
+                self.depth += 1
+            elif ch == "}":
+                self.depth -= 1
+                if self.depth == 0:
+                    return i + 1
+        return -1
+
+def iter_completion(**kwargs):
+    """
+    Yield the content deltas of a streamed chat completion. In JSON mode the
+    stream is closed as soon as the top-level object is complete, so trailing
+    whitespace the model sometimes pads JSON output with isn't waited for.
+    """
+    scanner = None
+    if kwargs.get("response_format", {}).get("type") == "json_object":
+        scanner = JsonEndScanner()
+    stream = get_openai().chat.completions.create(stream=True, **kwargs)
+    try:
+        for chunk in stream:
+            if not (chunk.choices and chunk.choices[0].delta.content):
+                continue
+            text = chunk.choices[0].delta.content
+            end = scanner.feed(text) if scanner else -1
+            if end >= 0:
+                yield text[:end]
+                return
+            yield text
+    finally:
+        stream.close()
+
+def stream_completion(**kwargs):
+    """
+    Run a streamed chat completion and return the concatenated content.
+    Streaming keeps the connection producing bytes during long generations
+    instead of idling until the whole completion is ready.
+    """
+    return "".join(iter_completion(**kwargs))
+
+def summary_request_args(model, transcript, system_prompt=SYSTEM_PROMPT):
+    return {
+        "model": model,
+        "messages": [
+            {"role": "system", "content": system_prompt},
+            {"role": "user", "content": transcript},
+        ],
+        "temperature": 0.2,
+        "response_format": {"type": "json_object"},
+    }
+
+def choose_model(transcript):
+    if FAST_SUMMARY_MODEL and len(transcript) // 4 < FAST_MODEL_MAX_TOKENS:
+        return FAST_SUMMARY_MODEL
+    return SUMMARY_MODEL
+
+def request_summary(model, transcript, system_prompt=SYSTEM_PROMPT):
+    """Call the given model under the concurrency limit and return its raw reply."""
+    if not _llm_slots.acquire(timeout=LLM_QUEUE_TIMEOUT):
+        raise ServiceBusyError("Too many summaries in progress, please retry shortly")
+    started = time.monotonic()
+    try:
+        ai_content = timeout_wrapper(
+            stream_completion,
+            **summary_request_args(model, transcript, system_prompt),
+            timeout=30,
+        )
+    finally:
+        _llm_slots.release()
+    app.logger.info("[OpenAI] %s replied in %.2fs (%s chars)", model, time.monotonic() - started, len(ai_content))
+    return ai_content
+
+class SummaryBatcher:
+    """
+    Fuses short transcripts that arrive within a small window into a single
+    chat completion, amortizing per-call latency under bursty load. Callers
+    get back the raw JSON reply for their own transcript, or None if the
+    batch failed and they should make their own call.
+    """
+
+    def __init__(self, window_seconds, max_size, model, max_in_flight=MAX_CONCURRENT_LLM):
+        self.window_seconds = window_seconds
+        self.max_size = max_size
+        self.model = model
+        self._queue = queue.Queue()
+        # Flushed batches wait here rather than each getting a thread
+        self._dispatchers = concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_in_flight, thread_name_prefix="summary-batch"
+        )
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def summarize(self, transcript, timeout=60):
+        future = concurrent.futures.Future()
+        self._ensure_started()
+        self._queue.put((transcript, future))
+        return future.result(timeout=timeout)
+
+    def _ensure_started(self):
+        # Started lazily so the thread belongs to the worker, not the pre-fork master
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._collect, name="summary-batcher", daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window_seconds
+            while len(batch) < self.max_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._dispatchers.submit(self._dispatch, batch)
+
+    def _dispatch(self, batch):
+        if len(batch) == 1:
+            batch[0][1].set_result(None)
+            return
+        numbered = "\n\n".join(f"### Transcript {i}\n{t}" for i, (t, _) in enumerate(batch, 1))
+        try:
+            reply = parse_summary_content(request_summary(self.model, numbered, BATCH_SYSTEM_PROMPT))
+            summaries = (reply or {}).get("summaries")
+            if not isinstance(summaries, list) or len(summaries) != len(batch):
+                raise ValueError("batched reply did not contain one summary per transcript")
+        except ServiceBusyError as e:
+            for _, future in batch:
+                future.set_exception(e)
+            return
+        except Exception as e:
+            app.logger.warning("[OpenAI] Batch of %s failed, falling back to single calls: %s", len(batch), e)
+            for _, future in batch:
+                future.set_result(None)
+            return
+        app.logger.info("[OpenAI] Summarized %s transcripts in one call", len(batch))
+        for (_, future), summary in zip(batch, summaries):
+            future.set_result(orjson.dumps(summary).decode())
+
+_summary_batcher = (
+    SummaryBatcher(SUMMARY_BATCH_WINDOW_MS / 1000, SUMMARY_BATCH_MAX, FAST_SUMMARY_MODEL or SUMMARY_MODEL)
+    if SUMMARY_BATCH_WINDOW_MS > 0 else None
+)
+
+# -----------------------------------------------------
+# Transcript preprocessing and map-reduce
+# -----------------------------------------------------
+_TIMESTAMP_RE = re.compile(r"\[\d{1,2}:\d{2}(?::\d{2})?\]")
+_SPACES_RE = re.compile(r"[ \t]+")
+_LINE_EDGE_RE = re.compile(r" ?\n ?")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+
+def preprocess(transcript):
+    """
+    Drop [hh:mm:ss] timestamps and redundant whitespace. Input tokens are billed
+    and add latency, and neither carries meaning for the summary. Line breaks
+    are kept because they separate speaker turns.
+    """
+    text = _TIMESTAMP_RE.sub("", transcript)
+    text = _SPACES_RE.sub(" ", text)
+    text = _LINE_EDGE_RE.sub("\n", text)
+    return _BLANK_LINES_RE.sub("\n\n", text).strip()
+
+def split_transcript(transcript, max_chars=MAP_REDUCE_CHUNK_CHARS):
+    """Pack whole lines into chunks of at most max_chars, slicing only overlong lines."""
+    chunks, current, size = [], [], 0
+    for line in transcript.splitlines(keepends=True):
+        for start in range(0, len(line), max_chars):
+            piece = line[start:start + max_chars]
+            if current and size + len(piece) > max_chars:
+                chunks.append("".join(current))
+                current, size = [], 0
+            current.append(piece)
+            size += len(piece)
+    if current:
+        chunks.append("".join(current))
+    return chunks
+
+_chunk_pool = concurrent.futures.ThreadPoolExecutor(
+    max_workers=MAP_REDUCE_WORKERS, thread_name_prefix="summary-chunk"
+)
+
+def needs_map_reduce(transcript):
+    """True for preprocessed transcripts too long to summarize in one call."""
+    return len(transcript) // 4 > MAP_REDUCE_MIN_TOKENS
+
+def map_reduce_summary(transcript):
+    """
+    Summarize each section concurrently, then merge the partial summaries in
+    one final call. Returns the merge call's raw reply. Sections that fail or
+    miss MAP_REDUCE_TIMEOUT are left out of the merge instead of failing the
+    whole summary.
+    """
+    chunks = split_transcript(transcript)
+    start = time.perf_counter()
+    futures = [_chunk_pool.submit(request_summary, choose_model(chunk), chunk) for chunk in chunks]
+    done, not_done = concurrent.futures.wait(futures, timeout=MAP_REDUCE_TIMEOUT)
+    for future in not_done:
+        future.cancel()
+
+    partials, errors = [], []
+    for number, future in enumerate(futures, 1):
+        if future not in done:
+            app.logger.warning("[OpenAI] Section %s/%s missed the %ss deadline", number, len(chunks), MAP_REDUCE_TIMEOUT)
+            continue
+        try:
+            data = parse_summary_content(future.result())
+        except Exception as e:
+            app.logger.warning("[OpenAI] Section %s/%s failed: %s", number, len(chunks), e)
+            errors.append(e)
+            continue
+        if data is not None:
+            partials.append(data)
+    app.logger.info(
+        "[OpenAI] Summarized %s/%s sections in %.2fs", len(partials), len(chunks), time.perf_counter() - start
+    )
+    if not partials:
+        if errors:
+            raise errors[0]  # Keep the busy/timeout status for the caller
+        return ""
+    return request_summary(SUMMARY_MODEL, orjson.dumps(partials).decode(), REDUCE_SYSTEM_PROMPT)
+
+def get_or_create_summary(transcript, use_cache=True):
+    """
+    Return the summary dict for a transcript, calling OpenAI only on a cache miss.
+    """
+    transcript = preprocess(transcript)
+    key = summary_cache_key(transcript)
+    if use_cache:
+        cached = cache_get(key)
+        if cached is not None:
+            app.logger.info("[Cache] Hit for transcript %s", key[-12:])
+            return cached
+
+    embedding = embed_transcript(transcript) if use_cache else None
+    if embedding is not None:
+        cached = semantic_lookup(embedding, semantic_namespace(transcript))
+        if cached is not None:
+            cache_set(key, cached)
+            return cached
+
+    model = choose_model(transcript)
+    ai_content = None
+    if needs_map_reduce(transcript):
+        model = SUMMARY_MODEL  # The merge step already ran on the full model
+        ai_content = map_reduce_summary(transcript)
+    elif _summary_batcher is not None and len(transcript) <= SUMMARY_BATCH_MAX_CHARS:
+        ai_content = _summary_batcher.summarize(transcript)
+    if ai_content is None:
+        ai_content = request_summary(model, transcript)
+    summary_data = parse_summary_content(ai_content)
+    if model != SUMMARY_MODEL and not is_valid_summary(summary_data):
+        app.logger.info("[OpenAI] %s output failed validation, escalating to %s", model, SUMMARY_MODEL)
+        ai_content = request_summary(SUMMARY_MODEL, transcript)
+        summary_data = parse_summary_content(ai_content)
+
+    if summary_data is None:
+        # Don't cache unparseable output so the next request gets a fresh attempt
+        return {
+            "summary": ai_content,
+            "action_items": "Could not parse action items.",
+            "key_questions": "Could not parse key questions.",
+        }
+
+    cache_set(key, summary_data)
+    if embedding is not None:
+        semantic_store(embedding, summary_data, semantic_namespace(transcript))
+    return summary_data
+
+def email_and_mark_sent(meeting_name, summary, action_items, key_questions, page_url, page_id):
+    """
+    Background job for /summarize. The new page already matches the unsent
+    query, so it's claimed like a sweep would claim it; whichever gets there
+    first sends the email. If the email fails the page keeps Sent=False, so
+    the next /api/email-notion-summary sweep picks it up again.
+    """
+    if not claim_pages([{"id": page_id}]):
+        app.logger.info("Page %s is already being emailed by a sweep", page_id)
+        return
+    if emailed_pages([page_id]):
+        release_page(page_id)
+        return
+    email_success, email_message = send_email_via_mailtrap(
+        meeting_name, summary, action_items, key_questions, page_url
+    )
+    if email_success:
+        remember_emailed(page_id)
+        mark_sent_and_release(page_id)
+    else:
+        release_page(page_id)
+        app.logger.warning("Email for page %s not sent: %s", page_id, email_message)
+
+class SummaryError(Exception):
+    """Raised when the model reply has no usable summary."""
+
+def create_summary_page(transcript, meeting_name, use_cache=True):
+    """
+    Summarize a transcript, store it as a Notion page and queue the email.
+    Returns the JSON body of a successful /summarize response.
+    """
+    return store_summary(get_or_create_summary(transcript, use_cache=use_cache), meeting_name)
+
+def store_summary(summary_data, meeting_name):
+    """Create the Notion page for a parsed summary and queue its email."""
+    summary_str = format_for_notion(summary_data.get("summary", ""))
+    action_items_str = format_for_notion(summary_data.get("action_items", ""))
+    key_questions_str = format_for_notion(summary_data.get("key_questions", ""))
+
+    # Validate that we have meaningful content
+    if not summary_str.strip() or summary_str.strip() == "Could not parse action items.":
+        raise SummaryError("AI failed to generate meaningful summary")
+
+    # Creating isn't idempotent, so only a 429 (never processed) is safe to retry
+    new_page = with_retries(
+        notion_call,
+        get_notion().pages.create,
+        retry_if=is_rate_limited,
+        parent={"database_id": notion_database_id},
+        properties={
+            "Meeting Name": {"title": [{"text": {"content": meeting_name}}]},
+            "Summary": {"rich_text": [{"text": {"content": summary_str}}]},
+            "Action Items": {"rich_text": [{"text": {"content": action_items_str}}]},
+            "Key Questions": {"rich_text": [{"text": {"content": key_questions_str}}]},
+            "Date": {"date": {"start": date.today().isoformat()}},
+            "Sent": {"checkbox": False},
+        },
+        timeout=20,
+    )
+
+    notion_url = new_page.get("url", "No URL available")
+
+    action_items = summary_data.get("action_items", "")
+    key_questions = summary_data.get("key_questions", "")
+
+    # The client only needs the Notion URL; email and the Sent flag happen in the background
+    _background.submit(
+        email_and_mark_sent,
+        meeting_name,
+        summary_str,
+        bullet_lines(action_items) if isinstance(action_items, list) else action_items_str,
+        bullet_lines(key_questions) if isinstance(key_questions, list) else key_questions_str,
+        notion_url,
+        new_page["id"],
+    )
+
+    return {
+        "message": "Summary created successfully!",
+        "notion_url": notion_url,
+        "email_status": "queued",
+    }
+
+# -----------------------------------------------------
+# Summarize jobs (/summarize?async=1)
+# -----------------------------------------------------
+# Job state lives in the SQLite cache file so a status poll can land on any
+# worker; the work itself runs on this worker's job pool.
+SUMMARY_JOB_WORKERS = int(os.getenv("SUMMARY_JOB_WORKERS", 4))
+SUMMARY_JOB_TTL = 86400
+# A job still running after this long lost its worker (restart, crash); even a
+# map-reduced summary finishes well within it. Queued jobs are left alone, as
+# a backlog on _jobs can keep them waiting for longer and they still run.
+SUMMARY_JOB_STALE_AFTER = int(os.getenv("SUMMARY_JOB_STALE_AFTER", 600))
+_jobs = concurrent.futures.ThreadPoolExecutor(max_workers=SUMMARY_JOB_WORKERS, thread_name_prefix="summarize-job")
+
+def save_job(job_id, status, result=None):
+    conn = _cache_db()
+    with conn:
+        now = time.time()
+        if status == "queued":
+            conn.execute("DELETE FROM summary_jobs WHERE updated_at < ?", (now - SUMMARY_JOB_TTL,))
+        conn.execute(
+            "INSERT OR REPLACE INTO summary_jobs (id, status, result_json, updated_at) VALUES (?, ?, ?, ?)",
+            (job_id, status, orjson.dumps(result).decode() if result is not None else None, now),
+        )
+
+def load_job(job_id):
+    row = _cache_db().execute(
+        "SELECT status, result_json, updated_at FROM summary_jobs WHERE id = ?", (job_id,)
+    ).fetchone()
+    if row is None:
+        return None
+    status, result_json, updated_at = row
+    if status == "running" and updated_at < time.time() - SUMMARY_JOB_STALE_AFTER:
+        return {"job_id": job_id, "status": "failed", "error": "Job was interrupted, please resubmit"}
+    return {"job_id": job_id, "status": status, **(orjson.loads(result_json) if result_json else {})}
+
+def run_summary_job(job_id, transcript, meeting_name, use_cache):
+    save_job(job_id, "running")
+    try:
+        result = create_summary_page(transcript, meeting_name, use_cache)
+    except Exception as e:
+        app.logger.exception("Summary job %s failed", job_id)
+        save_job(job_id, "failed", {"error": str(e)})
+    else:
+        save_job(job_id, "succeeded", result)
+
+# -----------------------------------------------------
+# OpenAI Batch API (/summarize/batch)
+# -----------------------------------------------------
+# Backlogs of transcripts go through the Batch API: half the token price and
+# a separate rate-limit pool, in exchange for results within 24h.
+BATCH_MAX_TRANSCRIPTS = 500
+# Batch states whose output/error files are final
+BATCH_FINAL_STATUSES = ("completed", "expired", "cancelled")
+# Processing saves progress after every line; a batch with none for this long
+# lost its worker and may be reclaimed by the next status poll
+BATCH_STALE_AFTER = int(os.getenv("BATCH_STALE_AFTER", 300))
+# Processing a large batch holds a worker for minutes of rate-limited Notion
+# writes, so it gets its own pool rather than queueing summarize jobs behind it
+BATCH_JOB_WORKERS = int(os.getenv("BATCH_JOB_WORKERS", 2))
+_batch_jobs = concurrent.futures.ThreadPoolExecutor(max_workers=BATCH_JOB_WORKERS, thread_name_prefix="batch-job")
+
+def submit_batch(items):
+    """Upload one chat completion request per transcript and start a batch job."""
+    buf = io.BytesIO()
+    for i, item in enumerate(items):
+        buf.write(orjson.dumps({
+            "custom_id": str(i),
+            "method": "POST",
+            "url": "/v1/chat/completions",
+            "body": summary_request_args(SUMMARY_MODEL, preprocess(item["transcript"])),
+        }))
+        buf.write(b"\n")
+    buf.seek(0)
+
+    client = get_openai()
+    batch_file = timeout_wrapper(client.files.create, file=("summaries.jsonl", buf), purpose="batch", timeout=60)
+    batch = timeout_wrapper(
+        client.batches.create,
+        input_file_id=batch_file.id,
+        endpoint="/v1/chat/completions",
+        completion_window="24h",
+        timeout=20,
+    )
+
+    meeting_names = [item.get("meetingName") or "Untitled Meeting" for item in items]
+    conn = _cache_db()
+    with conn:
+        conn.execute(
+            "INSERT INTO summary_batches (id, meeting_names, state, updated_at) VALUES (?, ?, 'submitted', ?)",
+            (batch.id, orjson.dumps(meeting_names).decode(), time.time()),
+        )
+    return batch
+
+def claim_batch(batch_id):
+    """
+    Atomically move a submitted batch, or one whose processing stalled, to
+    processing; only one poller wins.
+    """
+    conn = _cache_db()
+    with conn:
+        now = time.time()
+        cur = conn.execute(
+            "UPDATE summary_batches SET state = 'processing', updated_at = ? WHERE id = ? "
+            "AND (state = 'submitted' OR (state = 'processing' AND updated_at < ?))",
+            (now, batch_id, now - BATCH_STALE_AFTER),
+        )
+    return cur.rowcount == 1
+
+def save_batch_results(batch_id, state, results):
+    conn = _cache_db()
+    with conn:
+        conn.execute(
+            "UPDATE summary_batches SET state = ?, result_json = ?, updated_at = ? WHERE id = ?",
+            (state, orjson.dumps(sorted(results.values(), key=lambda r: r["index"])).decode(), time.time(), batch_id),
+        )
+
+def batch_error_message(record):
+    """The reason a batch line failed, from its error or its non-200 response body."""
+    error = record.get("error") or ((record.get("response") or {}).get("body") or {}).get("error") or {}
+    return error.get("message") or "Request failed in the batch"
+
+def process_batch_line(batch_id, record, meeting_name):
+    index = int(record["custom_id"])
+    result = {"index": index, "meeting_name": meeting_name}
+    try:
+        response = record.get("response") or {}
+        if record.get("error") or response.get("status_code") != 200:
+            raise SummaryError(batch_error_message(record))
+        summary_data = parse_summary_content(response["body"]["choices"][0]["message"]["content"])
+        if summary_data is None:
+            raise SummaryError("AI failed to generate meaningful summary")
+        result["notion_url"] = store_summary(summary_data, meeting_name)["notion_url"]
+    except Exception as e:
+        app.logger.warning("[Batch] %s line %s failed: %s", batch_id, index, e)
+        result["error"] = str(e) or type(e).__name__
+    return result
+
+def process_batch_output(batch_id, output_file_id, error_file_id=None):
+    """
+    Create a Notion page for every successful line of a finished batch and
+    record the error for every failed one. Results are saved line by line,
+    so a reclaimed batch resumes after the last line a dead worker saved.
+    """
+    conn = _cache_db()
+    meeting_names_json, result_json = conn.execute(
+        "SELECT meeting_names, result_json FROM summary_batches WHERE id = ?", (batch_id,)
+    ).fetchone()
+    meeting_names = orjson.loads(meeting_names_json)
+    results = {r["index"]: r for r in orjson.loads(result_json)} if result_json else {}
+    try:
+        for file_id in filter(None, (output_file_id, error_file_id)):
+            output = timeout_wrapper(get_openai().files.content, file_id, timeout=60).text
+            for line in output.splitlines():
+                if not line.strip():
+                    continue
+                record = orjson.loads(line)
+                index = int(record["custom_id"])
+                if index in results:
+                    continue  # Handled before this batch was reclaimed
+                results[index] = process_batch_line(batch_id, record, meeting_names[index])
+                save_batch_results(batch_id, "processing", results)
+        state = "done"
+    except Exception:
+        app.logger.exception("Processing batch %s failed", batch_id)
+        state = "failed"
+    save_batch_results(batch_id, state, results)
+
+# -----------------------------------------------------
+# Request validation
+# -----------------------------------------------------
+# Checked before any cache, OpenAI or Notion work so oversized or malformed
+# input costs nothing but the parse.
+MAX_TRANSCRIPT_CHARS = int(os.getenv("MAX_TRANSCRIPT_CHARS", 200_000))
+
+class InvalidRequestError(Exception):
+    """Raised for client errors; carries the HTTP status to answer with."""
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+def check_transcript(transcript):
+    if not transcript:
+        raise InvalidRequestError("No transcript provided")
+    if not isinstance(transcript, str):
+        raise InvalidRequestError("transcript must be a string")
+    if len(transcript) > MAX_TRANSCRIPT_CHARS:
+        raise InvalidRequestError(f"Transcript exceeds {MAX_TRANSCRIPT_CHARS} characters", 413)
+
+def check_meeting_name(meeting_name):
+    if not isinstance(meeting_name, str):
+        raise InvalidRequestError("meetingName must be a string")
+
+def parse_summarize_request():
+    """Return (transcript, meeting_name) from a /summarize JSON body."""
+    # cache=False: don't keep the raw body around next to the parsed transcript
+    data = request.get_json(silent=True, cache=False) or {}
+    if not isinstance(data, dict):
+        raise InvalidRequestError("Request body must be a JSON object")
+    transcript = data.get("transcript")
+    check_transcript(transcript)
+    meeting_name = data.get("meetingName", "Untitled Meeting")
+    check_meeting_name(meeting_name)
+    return transcript, meeting_name
+
 # -----------------------------------------------------
 # Routes
 # -----------------------------------------------------
+# index.html has no template variables, so render it once and serve the bytes
+INDEX_HTML = app.jinja_env.get_template("index.html").render().encode()
+
 @app.route("/")
 def index():
-    return render_template("index.html")
+    return Response(INDEX_HTML, mimetype="text/html", headers={"Cache-Control": "public, max-age=3600"})
 
 @app.route("/summarize", methods=["POST"])
 def summarize():
     try:
-        data = request.get_json(silent=True) or {}
-        transcript = data.get("transcript")
-        meeting_name = data.get("meetingName", "Untitled Meeting")
-
-        if not transcript:
-            return jsonify({"error": "No transcript provided"}), 400
-
-        prompt = f"""
-        Please analyze the following meeting transcript and extract:
-        - A concise summary.
-        - Action items with owners.
-        - Key questions unresolved.
-
-        Format as JSON with keys: summary, action_items, key_questions.
+        transcript, meeting_name = parse_summarize_request()
+        use_cache = request.args.get("no_cache") != "1"
+        # Map-reduce can take longer than a request should be held open, so
+        # long transcripts always run as a job
+        if request.args.get("async") == "1" or needs_map_reduce(preprocess(transcript)):
+            job_id = uuid.uuid4().hex
+            save_job(job_id, "queued")
+            _jobs.submit(run_summary_job, job_id, transcript, meeting_name, use_cache)
+            return jsonify({
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": url_for("summarize_status", job_id=job_id),
+            }), 202
 
-        Transcript:
-        {transcript}
-        """
+        return jsonify(create_summary_page(transcript, meeting_name, use_cache)), 200
+    except RequestEntityTooLarge:
+        return jsonify({"error": "Request body too large"}), 413
+    except InvalidRequestError as ie:
+        return jsonify({"error": str(ie)}), ie.status
+    except ServiceBusyError as be:
+        app.logger.warning("Rejecting summarize request: %s", be)
+        return jsonify({"error": str(be)}), 503, {"Retry-After": "5"}
+    except SummaryError as se:
+        return jsonify({"error": str(se)}), 500
+    except TimeoutError as te:
+        app.logger.error("Timeout: %s", te)
+        return jsonify({"error": "Operation timed out", "details": str(te)}), 504
+    except Exception as e:
+        app.logger.exception("Request to %s failed", request.path)
+        return jsonify({"error": str(e)}), 500
 
-        response = timeout_wrapper(
-            openai_client.chat.completions.create,
-            model="gpt-4-turbo",
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.2,
-            timeout=30,
-        )
+def sse_event(event, payload):
+    return f"event: {event}\ndata: {orjson.dumps(payload).decode()}\n\n"
 
-        ai_content = response.choices[0].message.content
-        cleaned_content = extract_json_from_markdown(ai_content)
+@app.route("/summarize/stream", methods=["POST"])
+def summarize_stream():
+    """
+    Server-sent events variant of /summarize: relays model tokens as 'delta'
+    events while they're generated, then stores the page and finishes with a
+    'done' event carrying the usual response body (or an 'error' event).
+    Long transcripts go through map-reduce and send no deltas.
+    """
+    try:
+        raw_transcript, meeting_name = parse_summarize_request()
+    except RequestEntityTooLarge:
+        return jsonify({"error": "Request body too large"}), 413
+    except InvalidRequestError as ie:
+        return jsonify({"error": str(ie)}), ie.status
+    use_cache = request.args.get("no_cache") != "1"
 
+    def generate():
         try:
-            summary_data = json.loads(cleaned_content)
-        except json.JSONDecodeError:
-            summary_data = {
-                "summary": ai_content,
-                "action_items": "Could not parse action items.",
-                "key_questions": "Could not parse key questions.",
-            }
+            transcript = preprocess(raw_transcript)
+            key = summary_cache_key(transcript)
+            summary_data = cache_get(key) if use_cache else None
+            if summary_data is None and needs_map_reduce(transcript):
+                # Sections are summarized in parallel, so there are no tokens to relay
+                summary_data = get_or_create_summary(transcript, use_cache=use_cache)
+            if summary_data is None:
+                model = choose_model(transcript)
+                if not _llm_slots.acquire(timeout=LLM_QUEUE_TIMEOUT):
+                    yield sse_event("error", {"error": "Too many summaries in progress, please retry shortly"})
+                    return
+                parts = []
+                try:
+                    for delta in iter_completion(**summary_request_args(model, transcript)):
+                        parts.append(delta)
+                        yield sse_event("delta", {"delta": delta})
+                finally:
+                    _llm_slots.release()
+                summary_data = parse_summary_content("".join(parts))
+                if model != SUMMARY_MODEL and not is_valid_summary(summary_data):
+                    app.logger.info("[OpenAI] %s output failed validation, escalating to %s", model, SUMMARY_MODEL)
+                    summary_data = parse_summary_content(request_summary(SUMMARY_MODEL, transcript))
+                if summary_data is None:
+                    raise SummaryError("AI failed to generate meaningful summary")
+                cache_set(key, summary_data)
+            yield sse_event("done", store_summary(summary_data, meeting_name))
+        except Exception as e:
+            app.logger.exception("Streaming summary failed")
+            yield sse_event("error", {"error": str(e)})
 
-        summary_str = format_for_notion(summary_data.get("summary", ""))
-        action_items_str = format_for_notion(summary_data.get("action_items", ""))
-        key_questions_str = format_for_notion(summary_data.get("key_questions", ""))
-
-        # Validate that we have meaningful content
-        if not summary_str.strip() or summary_str.strip() == "Could not parse action items.":
-            return jsonify({"error": "AI failed to generate meaningful summary"}), 500
-
-        new_page = timeout_wrapper(
-            notion.pages.create,
-            parent={"database_id": notion_database_id},
-            properties={
-                "Meeting Name": {"title": [{"text": {"content": meeting_name}}]},
-                "Summary": {"rich_text": [{"text": {"content": summary_str}}]},
-                "Action Items": {"rich_text": [{"text": {"content": action_items_str}}]},
-                "Key Questions": {"rich_text": [{"text": {"content": key_questions_str}}]},
-                "Date": {"date": {"start": datetime.now().isoformat()[:10]}},
-                "Sent": {"checkbox": False},
-            },
-            timeout=20,
-        )
+    return Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
-        notion_url = new_page.get("url", "No URL available")
+@app.route("/summarize/status/<job_id>")
+def summarize_status(job_id):
+    job = load_job(job_id)
+    if job is None:
+        return jsonify({"error": "Unknown job"}), 404
+    return jsonify(job), 200
 
-        email_success, email_message = send_email_via_mailtrap(
-            meeting_name, summary_str, action_items_str, key_questions_str, notion_url
-        )
+@app.route("/summarize/batch", methods=["POST"])
+def summarize_batch():
+    try:
+        data = request.get_json(silent=True, cache=False) or {}
+        if not isinstance(data, dict):
+            raise InvalidRequestError("Request body must be a JSON object")
+        items = data.get("transcripts")
+        if not isinstance(items, list) or not items:
+            return jsonify({"error": "No transcripts provided"}), 400
+        if len(items) > BATCH_MAX_TRANSCRIPTS:
+            return jsonify({"error": f"At most {BATCH_MAX_TRANSCRIPTS} transcripts per batch"}), 400
+        for item in items:
+            if not isinstance(item, dict) or not item.get("transcript"):
+                return jsonify({"error": "Every item needs a transcript"}), 400
+            check_transcript(item["transcript"])
+            check_meeting_name(item.get("meetingName", ""))
 
-        if email_success:
-            timeout_wrapper(
-                notion.pages.update,
-                page_id=new_page["id"],
-                properties={"Sent": {"checkbox": True}},
-                timeout=15,
-            )
+        batch = submit_batch(items)
+        return jsonify({
+            "batch_id": batch.id,
+            "status": batch.status,
+            "status_url": url_for("summarize_batch_status", batch_id=batch.id),
+        }), 202
+    except RequestEntityTooLarge:
+        return jsonify({"error": "Request body too large"}), 413
+    except InvalidRequestError as ie:
+        return jsonify({"error": str(ie)}), ie.status
+    except TimeoutError as te:
+        app.logger.error("Timeout: %s", te)
+        return jsonify({"error": "Operation timed out", "details": str(te)}), 504
+    except Exception as e:
+        app.logger.exception("Request to %s failed", request.path)
+        return jsonify({"error": str(e)}), 500
 
+@app.route("/summarize/batch/<batch_id>")
+def summarize_batch_status(batch_id):
+    try:
+        row = _cache_db().execute(
+            "SELECT state, result_json, updated_at FROM summary_batches WHERE id = ?", (batch_id,)
+        ).fetchone()
+        if row is None:
+            return jsonify({"error": "Unknown batch"}), 404
+        state, result_json, updated_at = row
+        stalled = state == "processing" and updated_at < time.time() - BATCH_STALE_AFTER
+        if state in ("done", "failed", "processing") and not stalled:
+            return jsonify({
+                "batch_id": batch_id,
+                "status": state,
+                "results": orjson.loads(result_json) if result_json else [],
+            }), 200
+
+        batch = timeout_wrapper(get_openai().batches.retrieve, batch_id, timeout=20)
+        if (
+            batch.status in BATCH_FINAL_STATUSES
+            and (batch.output_file_id or batch.error_file_id)
+            and claim_batch(batch_id)
+        ):
+            if stalled:
+                app.logger.warning("[Batch] Reclaiming stalled batch %s", batch_id)
+            _batch_jobs.submit(process_batch_output, batch_id, batch.output_file_id, batch.error_file_id)
+            return jsonify({"batch_id": batch_id, "status": "processing", "results": []}), 200
         return jsonify({
-            "message": "Summary created successfully!",
-            "notion_url": notion_url,
-            "email_sent": email_success,
-            "email_message": email_message,
+            "batch_id": batch_id,
+            "status": batch.status,
+            "request_counts": batch.request_counts.model_dump() if batch.request_counts else None,
         }), 200
     except TimeoutError as te:
-        logging.error("Timeout: %s", str(te))
+        app.logger.error("Timeout: %s", te)
         return jsonify({"error": "Operation timed out", "details": str(te)}), 504
     except Exception as e:
-        traceback.print_exc()
+        app.logger.exception("Request to %s failed", request.path)
         return jsonify({"error": str(e)}), 500
 
-@app.route("/api/email-notion-summary", methods=["POST"])
-def email_notion_summary():
-    try:
-        app.logger.info("Starting email-notion-summary processing")
-        # Process only a limited number of pages to prevent timeouts
-        query = {
-            "filter": {"property": "Sent", "checkbox": {"equals": False}},
-            "page_size": 5  # Limit to 5 pages per request
-        }
-        results = timeout_wrapper(
-            notion.databases.query,
-            database_id=notion_database_id,
-            **query,
+# Property name -> (Notion type, fallback text), in the order the email needs them
+EMAIL_PAGE_FIELDS = {
+    "Meeting Name": ("title", "No Title"),
+    "Summary": ("rich_text", "No summary"),
+    "Action Items": ("rich_text", "No action items"),
+    "Key Questions": ("rich_text", "No key questions"),
+}
+
+SWEEP_WORKERS = int(os.getenv("SWEEP_WORKERS", SMTP_POOL_SIZE))
+_sweep_pool = concurrent.futures.ThreadPoolExecutor(max_workers=SWEEP_WORKERS, thread_name_prefix="email-sweep")
+
+UNSENT_QUERY_TTL = int(os.getenv("UNSENT_QUERY_TTL", 30))
+# Pages emailed per sweep; the rest are reported through has_more
+SWEEP_MAX_PAGES = int(os.getenv("SWEEP_MAX_PAGES", 50))
+NOTION_MAX_PAGE_SIZE = 100
+
+def slim_page(page):
+    """
+    Keep only what the sweep reads. Full page objects carry every property
+    plus parent/user metadata, and these stay cached for UNSENT_QUERY_TTL.
+    """
+    props = page.get("properties", {})
+    return {
+        "id": page.get("id"),
+        "url": page.get("url"),
+        "properties": {name: props[name] for name in EMAIL_PAGE_FIELDS if name in props},
+    }
+
+@cache.memoize(timeout=UNSENT_QUERY_TTL)
+def query_unsent_pages(database_id):
+    """
+    Up to SWEEP_MAX_PAGES unsent summaries, following Notion's cursor in
+    full-size pages. Memoized briefly so a burst of sweep triggers that find
+    nothing to send costs one Notion query; each Sent write drops the entry
+    so the next query sees the fresh flag.
+    """
+    pages, cursor = [], None
+    while True:
+        cursor_arg = {"start_cursor": cursor} if cursor else {}
+        results = with_retries(
+            notion_call,
+            get_notion().databases.query,
+            database_id=database_id,
+            filter=UNSENT_FILTER,
+            page_size=min(NOTION_MAX_PAGE_SIZE, SWEEP_MAX_PAGES - len(pages)),
             timeout=20,
+            **cursor_arg,
         )
+        pages.extend(map(slim_page, results.get("results", [])))
+        if not results.get("has_more") or len(pages) >= SWEEP_MAX_PAGES:
+            return {"results": pages, "has_more": results.get("has_more", False)}
+        cursor = results["next_cursor"]
 
-        new_pages = results.get("results", [])
-        app.logger.info(f"Found {len(new_pages)} unsent pages")
-        processed = 0
-        processed_ids = set()  # Track processed page IDs to avoid duplicates
-
-        for page in new_pages:
-            page_id = page.get("id")
-            props = page.get("properties", {})
-            
-            # Check if meeting name is empty
-            meeting_name = safe_get_text(props.get("Meeting Name", {}), "title", page_id, "Meeting Name")
-            if not meeting_name or meeting_name == "No Title":
-                app.logger.info(f"Skipping page {page_id} with empty meeting name")
-                continue
-            
-            # Check if summary is empty
-            summary = safe_get_text(props.get("Summary", {}), "rich_text", page_id, "Summary")
-            if not summary or summary == "No summary provided.":
-                app.logger.info(f"Skipping page {page_id} with empty summary")
-                continue
-            
-            # Skip if we've already processed this page
-            if page_id in processed_ids:
-                app.logger.warning(f"Skipping duplicate page: {page_id}")
-                continue
-                
-            processed_ids.add(page_id)
-            
-            # Extract properties with correct types
-            meeting_name = safe_get_text(props.get("Meeting Name", {}), "title", page_id, "Meeting Name") or "No Title"
-            summary = safe_get_text(props.get("Summary", {}), "rich_text", page_id, "Summary") or "No summary"
-            action_items = safe_get_text(props.get("Action Items", {}), "rich_text", page_id, "Action Items") or "No action items"
-            key_questions = safe_get_text(props.get("Key Questions", {}), "rich_text", page_id, "Key Questions") or "No key questions"
-            notion_url = page.get("url", "No URL available")
-
-            app.logger.info(f"Processing page: {page_id} ({notion_url})")
-
-            email_success, _ = send_email_via_mailtrap(
-                meeting_name, summary, action_items, key_questions, notion_url
-            )
+# Pages an earlier, still-running sweep in this process is emailing. A page
+# stays claimed until its Sent flag is written, so an overlapping sweep that
+# still sees Sent=False doesn't email it twice.
+_in_flight_pages = set()
+_in_flight_lock = threading.Lock()
+
+# The set only covers this process; claims are also written to the shared
+# SQLite file so sweeps in other gunicorn workers skip the page too. A claim
+# left behind by a crashed worker lapses after PAGE_CLAIM_TTL.
+PAGE_CLAIM_TTL = int(os.getenv("PAGE_CLAIM_TTL", 600))
+
+def claim_shared(page_ids):
+    """Claim page_ids across workers; returns the ids this process now holds."""
+    now = time.time()
+    try:
+        with _cache_db() as db:
+            db.execute("DELETE FROM page_claims WHERE claimed_at <= ?", (now - PAGE_CLAIM_TTL,))
+            return {
+                page_id
+                for page_id in page_ids
+                if db.execute(
+                    "INSERT OR IGNORE INTO page_claims (page_id, claimed_at) VALUES (?, ?)",
+                    (page_id, now),
+                ).rowcount
+            }
+    except sqlite3.Error as e:
+        # Fall back to the in-process claim rather than stall the sweep
+        app.logger.warning("[Notion] Shared page claim failed: %s", e)
+        return set(page_ids)
+
+def claim_pages(pages):
+    """Return the pages no other sweep holds, marking them as held."""
+    with _in_flight_lock:
+        claimed = [page for page in pages if page["id"] not in _in_flight_pages]
+        _in_flight_pages.update(page["id"] for page in claimed)
+    held = claim_shared([page["id"] for page in claimed])
+    for page in claimed:
+        if page["id"] not in held:
+            with _in_flight_lock:
+                _in_flight_pages.discard(page["id"])
+    return [page for page in claimed if page["id"] in held]
+
+def release_page(page_id):
+    try:
+        with _cache_db() as db:
+            db.execute("DELETE FROM page_claims WHERE page_id = ?", (page_id,))
+    except sqlite3.Error as e:
+        app.logger.warning("[Notion] Could not release claim on page %s: %s", page_id, e)
+    with _in_flight_lock:
+        _in_flight_pages.discard(page_id)
+
+def mark_sent_and_release(page_id):
+    try:
+        mark_page_sent(page_id)
+    finally:
+        release_page(page_id)
+
+def read_page_fields(page):
+    """Extract each EMAIL_PAGE_FIELDS property once, as raw text ("" if missing)."""
+    page_id = page.get("id")
+    props = page.get("properties", {})
+    return {
+        name: safe_get_text(props.get(name, {}), key_type, page_id, name)
+        for name, (key_type, _) in EMAIL_PAGE_FIELDS.items()
+    }
+
+def send_page_email(page, fields):
+    """Email one unsent page and queue its Sent update; returns True if the email went out."""
+    page_id = page.get("id")
+    meeting_name, summary, action_items, key_questions = (
+        fields[name] or default for name, (_, default) in EMAIL_PAGE_FIELDS.items()
+    )
+    notion_url = page.get("url") or "No URL available"
+
+    app.logger.info("Processing page: %s (%s)", page_id, notion_url)
+
+    queued = False
+    try:
+        email_success, _ = send_email_via_mailtrap(
+            meeting_name, summary, action_items, key_questions, notion_url
+        )
+        if email_success:
+            # The caller only needs the count; the flag flips in the background
+            remember_emailed(page_id)
+            _background.submit(mark_sent_and_release, page_id)
+            queued = True
+        return email_success
+    finally:
+        if not queued:
+            release_page(page_id)
+
+def run_email_sweep():
+    """Email every sendable unsent page; returns the sweep's response body."""
+    app.logger.info("Starting email-notion-summary processing")
+    results = query_unsent_pages(notion_database_id)
+
+    new_pages = results.get("results", [])
+    app.logger.info("Found %s unsent pages", len(new_pages))
+    to_send = []
+    page_fields = {}
+    processed_ids = set()  # Track processed page IDs to avoid duplicates
 
-            if email_success:
-                timeout_wrapper(
-                    notion.pages.update,
-                    page_id=page_id,
-                    properties={"Sent": {"checkbox": True}},
-                    timeout=15,
-                )
-                processed += 1
+    for page in new_pages:
+        page_id = page.get("id")
+        fields = read_page_fields(page)
 
-        return jsonify({"message": f"Processed {processed} unsent meeting summaries.", "has_more": results.get("has_more", False)}), 200
+        # Check if meeting name is empty
+        meeting_name = fields["Meeting Name"]
+        if not meeting_name or meeting_name == "No Title":
+            app.logger.info("Skipping page %s with empty meeting name", page_id)
+            continue
+
+        # Check if summary is empty
+        summary = fields["Summary"]
+        if not summary or summary == "No summary provided.":
+            app.logger.info("Skipping page %s with empty summary", page_id)
+            continue
+
+        # Skip if we've already processed this page
+        if page_id in processed_ids:
+            app.logger.warning("Skipping duplicate page: %s", page_id)
+            continue
+
+        processed_ids.add(page_id)
+        page_fields[page_id] = fields
+        to_send.append(page)
+
+    claimed = claim_pages(to_send)
+    if len(claimed) < len(to_send):
+        app.logger.info("Skipping %s pages already being sent", len(to_send) - len(claimed))
+
+    # Checked only once claimed, so a sender that records the page and
+    # releases it in between can't slip past
+    emailed = emailed_pages([page["id"] for page in claimed])
+    unflagged = [page_id for page_id, flagged in emailed.items() if not flagged]
+    if unflagged:
+        # Delivered earlier but the Sent write failed: retry only the flag
+        app.logger.info("Re-flagging %s pages that were already emailed", len(unflagged))
+    for page_id, flagged in emailed.items():
+        if flagged:
+            release_page(page_id)  # Stale query result; the flag is already written
+        else:
+            _background.submit(mark_sent_and_release, page_id)
+    to_send = [page for page in claimed if page["id"] not in emailed]
+
+    # SMTP round trips dominate, so send the pages concurrently. The unsent
+    # query memo is dropped by each Sent write, not here.
+    processed = sum(_sweep_pool.map(send_page_email, to_send, [page_fields[page["id"]] for page in to_send]))
+
+    return {"message": f"Processed {processed} unsent meeting summaries.", "has_more": results.get("has_more", False)}
+
+def run_email_sweep_job():
+    with app.app_context():
+        try:
+            app.logger.info("Background sweep finished: %s", run_email_sweep()["message"])
+        except Exception:
+            app.logger.exception("Background email sweep failed")
+
+# Async sweeps get their own single worker so a scheduler firing repeatedly
+# can't crowd summarize jobs off _jobs. At most one sweep waits behind the
+# running one; it will see anything that arrived since that one's query.
+_sweep_jobs = concurrent.futures.ThreadPoolExecutor(max_workers=1, thread_name_prefix="sweep-job")
+_queued_sweep = None
+_queued_sweep_lock = threading.Lock()
+
+def queue_email_sweep():
+    """Queue a background sweep unless one is already waiting; returns whether it queued one."""
+    global _queued_sweep
+    with _queued_sweep_lock:
+        if _queued_sweep is not None and not (_queued_sweep.running() or _queued_sweep.done()):
+            return False
+        _queued_sweep = _sweep_jobs.submit(run_email_sweep_job)
+        return True
+
+@app.route("/api/email-notion-summary", methods=["POST"])
+@app.route("/functions/email-notion-summary", methods=["POST"])
+def email_notion_summary():
+    try:
+        if request.args.get("async") == "1":
+            # Schedulers only need to know a sweep is coming
+            queued = queue_email_sweep()
+            return jsonify({"status": "queued" if queued else "already_queued"}), 202
+        return jsonify(run_email_sweep()), 200
     except TimeoutError as te:
-        logging.error("Timeout: %s", str(te))
+        app.logger.error("Timeout: %s", te)
         return jsonify({"error": "Operation timed out", "details": str(te)}), 504
     except Exception as e:
-        traceback.print_exc()
+        app.logger.exception("Request to %s failed", request.path)
         return jsonify({"error": str(e)}), 500
 
-@app.route("/functions/email-notion-summary", methods=["POST"])
-def functions_email_notion_summary():
-    return email_notion_summary()
-
 # -----------------------------------------------------
 # Entrypoint
 # -----------------------------------------------------
@@ -0,0 +1,18 @@
+import os
+
+# -----------------------------------------------------
+# Gunicorn settings
+# -----------------------------------------------------
+# Requests spend nearly all their time waiting on OpenAI, Notion and SMTP, so
+# threaded workers let one slow /summarize run alongside many others instead
+# of holding an entire sync worker.
+#
+# GUNICORN_WORKER_CLASS=gevent swaps threads for greenlets (gunicorn patches
+# the stdlib before loading the app), which suits many long-lived
+# /summarize/stream connections; worker_connections caps greenlets per worker.
+bind = f"0.0.0.0:{os.getenv('PORT', '5000')}"
+worker_class = os.getenv("GUNICORN_WORKER_CLASS", "gthread")
+workers = int(os.getenv("WEB_CONCURRENCY", 2))
+threads = int(os.getenv("GUNICORN_THREADS", 16))
+worker_connections = int(os.getenv("GUNICORN_WORKER_CONNECTIONS", 1000))
+timeout = int(os.getenv("GUNICORN_TIMEOUT", 120))
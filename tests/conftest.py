@@ -0,0 +1,155 @@
+import concurrent.futures
+import os
+import sys
+import tempfile
+import types
+
+import pytest
+
+# app.py reads its configuration at import time
+_tmp = tempfile.mkdtemp(prefix="summarizer-tests-")
+os.environ.update(
+    MAIL_SERVER="localhost",
+    MAIL_PORT="2525",
+    MAILTRAP_VERIFIED_SENDER="sender@example.com",
+    OPENAI_API_KEY="test",
+    NOTION_API_KEY="test",
+    NOTION_DATABASE_ID="db",
+    SUMMARY_CACHE_PATH=os.path.join(_tmp, "summaries.db"),
+    JINJA_CACHE_DIR=os.path.join(_tmp, "jinja"),
+    SEMANTIC_CACHE="0",
+    LOG_LEVEL="WARNING",
+)
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app as app_module  # noqa: E402
+
+TABLES = ("summaries", "semantic_summaries", "summary_jobs", "summary_batches", "emailed_pages", "page_claims")
+
+
+class InlineExecutor:
+    """Runs submitted work immediately on the caller's thread."""
+
+    def submit(self, fn, *args, **kwargs):
+        future = concurrent.futures.Future()
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class DeferredExecutor:
+    """Holds submitted work until the test calls drain()."""
+
+    def __init__(self):
+        self.pending = []
+
+    def submit(self, fn, *args, **kwargs):
+        self.pending.append((fn, args, kwargs))
+        return concurrent.futures.Future()
+
+    def drain(self):
+        while self.pending:
+            fn, args, kwargs = self.pending.pop(0)
+            fn(*args, **kwargs)
+
+
+def notion_page(page_id, name="Weekly sync", summary="Discussed the roadmap"):
+    text = lambda value: [{"text": {"content": value}}]
+    return {
+        "id": page_id,
+        "url": f"https://notion.so/{page_id}",
+        "properties": {
+            "Meeting Name": {"title": text(name)},
+            "Summary": {"rich_text": text(summary)},
+            "Action Items": {"rich_text": text("• Ship it")},
+            "Key Questions": {"rich_text": text("• When?")},
+        },
+    }
+
+
+class FakeNotion:
+    """
+    Just enough of notion_client.Client for the app. With stale=True the
+    query keeps returning pages after they're flagged, like a cached copy of
+    an older query result would.
+    """
+
+    def __init__(self):
+        self.pages_by_id = {}
+        self.sent = set()
+        self.updates = []
+        self.queries = 0
+        self.stale = False
+        self.databases = types.SimpleNamespace(query=self._query)
+        self.pages = types.SimpleNamespace(update=self._update, create=self._create)
+
+    def add(self, page_id, **fields):
+        self.pages_by_id[page_id] = notion_page(page_id, **fields)
+
+    def _query(self, **kwargs):
+        self.queries += 1
+        results = [
+            page for page_id, page in self.pages_by_id.items()
+            if self.stale or page_id not in self.sent
+        ]
+        return {"results": results, "has_more": False, "next_cursor": None}
+
+    def _update(self, page_id, properties):
+        self.updates.append(page_id)
+        if properties.get("Sent", {}).get("checkbox"):
+            self.sent.add(page_id)
+        return {"id": page_id}
+
+    def _create(self, parent, properties):
+        page_id = f"new-{len(self.pages_by_id)}"
+        self.pages_by_id[page_id] = {"id": page_id, "url": f"https://notion.so/{page_id}", "properties": properties}
+        return self.pages_by_id[page_id]
+
+
+@pytest.fixture(autouse=True)
+def clean_state():
+    db = app_module._cache_db()
+    with db:
+        for table in TABLES:
+            db.execute(f"DELETE FROM {table}")
+    with app_module._in_flight_lock:
+        app_module._in_flight_pages.clear()
+    with app_module.app.app_context():
+        app_module.cache.clear()
+    yield
+
+
+@pytest.fixture
+def notion(monkeypatch):
+    fake = FakeNotion()
+    monkeypatch.setattr(app_module, "get_notion", lambda: fake)
+    monkeypatch.setattr(app_module, "_notion_bucket", app_module.TokenBucket(rate=1e6, capacity=1e6))
+    return fake
+
+
+@pytest.fixture
+def outbox(monkeypatch):
+    sent = []
+    monkeypatch.setattr(app_module, "send_pooled", sent.append)
+    return sent
+
+
+@pytest.fixture
+def background(monkeypatch):
+    executor = DeferredExecutor()
+    monkeypatch.setattr(app_module, "_background", executor)
+    return executor
+
+
+@pytest.fixture
+def no_sleep(monkeypatch):
+    delays = []
+    monkeypatch.setattr(app_module.time, "sleep", delays.append)
+    return delays
+
+
+@pytest.fixture
+def client():
+    return app_module.app.test_client()
@@ -0,0 +1,104 @@
+import smtplib
+
+import pytest
+
+import app
+
+
+class FakeSMTP:
+    def __init__(self, fail_with=None):
+        self.fail_with = fail_with
+        self.closed = False
+
+    def noop(self):
+        return 250, b"ok"
+
+    def quit(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, host):
+        self.host = host
+
+    def send(self, msg):
+        if self.host.fail_with:
+            raise self.host.fail_with
+
+
+class SMTPStub:
+    """Stands in for _open_smtp; new sessions fail with `fail_with` if set."""
+
+    def __init__(self):
+        self.opened = []
+        self.fail_with = None
+
+    def __call__(self):
+        self.opened.append(FakeConnection(FakeSMTP(self.fail_with)))
+        return self.opened[-1]
+
+
+@pytest.fixture
+def smtp(monkeypatch):
+    stub = SMTPStub()
+    monkeypatch.setattr(app, "_smtp_pool", app.queue.LifoQueue(maxsize=app.SMTP_POOL_SIZE))
+    monkeypatch.setattr(app, "_open_smtp", stub)
+    return stub
+
+
+def test_failed_resend_closes_fresh_connection(smtp):
+    stale = FakeConnection(FakeSMTP(smtplib.SMTPServerDisconnected("gone")))
+    app._smtp_pool.put(stale)
+    smtp.fail_with = smtplib.SMTPDataError(554, b"rejected")
+
+    with pytest.raises(smtplib.SMTPDataError):
+        app.send_pooled(object())
+
+    assert stale.host.closed
+    assert smtp.opened[-1].host.closed
+    assert app._smtp_pool.empty()
+
+
+def test_successful_send_returns_connection_to_pool(smtp):
+    app.send_pooled(object())
+
+    assert app._smtp_pool.qsize() == 1
+
+
+def send_summary_email():
+    return app.send_email_via_mailtrap("Sync", "Summary", ["• a"], "• q", "https://notion.so/p1")
+
+
+def test_timed_out_send_is_not_retried(monkeypatch, no_sleep):
+    attempts = []
+
+    def send_pooled(msg):
+        attempts.append(msg)
+        raise TimeoutError("timed out")
+
+    monkeypatch.setattr(app, "send_pooled", send_pooled)
+
+    assert send_summary_email()[0] is False
+    assert len(attempts) == 1
+
+
+def test_temporary_smtp_failure_is_retried(monkeypatch, no_sleep):
+    attempts = []
+
+    def send_pooled(msg):
+        attempts.append(msg)
+        if len(attempts) == 1:
+            raise smtplib.SMTPDataError(451, b"try again later")
+
+    monkeypatch.setattr(app, "send_pooled", send_pooled)
+
+    assert send_summary_email()[0] is True
+    assert len(attempts) == 2
+
+
+def test_email_renders_both_parts(outbox):
+    assert send_summary_email() == (True, "Email sent successfully via Mailtrap!")
+    msg, = outbox
+    assert msg.subject == "Meeting Summary: Sync"
+    assert "• a" in msg.body and "• q" in msg.body
+    assert "https://notion.so/p1" in msg.html
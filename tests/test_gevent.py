@@ -0,0 +1,41 @@
+import os
+import subprocess
+import sys
+import textwrap
+
+import pytest
+
+pytest.importorskip("gevent")
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SCRIPT = textwrap.dedent("""
+    from gevent import monkey
+    monkey.patch_all()
+
+    import sqlite3
+    opened = []
+    _connect = sqlite3.connect
+    sqlite3.connect = lambda *args, **kwargs: opened.append(args) or _connect(*args, **kwargs)
+
+    import gevent
+    import app
+
+    def request(i):
+        app.cache_set(f"key{i}", {"summary": str(i)})
+        assert app.cache_get(f"key{i}") == {"summary": str(i)}
+
+    gevent.joinall([gevent.spawn(request, i) for i in range(50)], raise_error=True)
+    # One connection runs the schema, one serves every greenlet
+    print(len(opened))
+""")
+
+
+def test_greenlets_share_one_sqlite_connection(tmp_path):
+    env = dict(os.environ, SUMMARY_CACHE_PATH=str(tmp_path / "summaries.db"))
+    result = subprocess.run(
+        [sys.executable, "-c", SCRIPT], cwd=ROOT, env=env, capture_output=True, text=True, timeout=60,
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "2"
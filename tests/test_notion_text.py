@@ -0,0 +1,36 @@
+import pytest
+
+import app
+
+
+def rich_text(value):
+    return {"rich_text": [{"text": {"content": value}}]}
+
+
+def test_reads_first_text_element():
+    assert app.safe_get_text(rich_text("hello")) == "hello"
+    assert app.safe_get_text({"title": [{"text": {"content": "t"}}]}, "title") == "t"
+
+
+@pytest.mark.parametrize("prop", [
+    None,
+    {},
+    {"rich_text": []},
+    {"title": []},
+    "not a dict",
+    {"rich_text": {"0": "dict-shaped"}},
+    {"rich_text": ["not a dict"]},
+    {"rich_text": [{"text": None}]},
+])
+def test_malformed_properties_read_as_empty(prop):
+    assert app.safe_get_text(prop, "rich_text", "p1", "Summary") == ""
+
+
+def test_format_for_notion():
+    assert app.format_for_notion("plain") == "plain"
+    assert app.format_for_notion([{"action": "Ship", "owner": "Ana"}, {"action": "Test"}]) == (
+        "• Ship (Owner: Ana)\n• Test"
+    )
+    assert app.format_for_notion(["a", "b"]) == "• a\n• b"
+    assert app.format_for_notion({"k": 1}) == '{\n  "k": 1\n}'
+    assert app.format_for_notion(None) == "None"
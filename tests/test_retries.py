@@ -0,0 +1,112 @@
+import threading
+import time
+
+import httpx
+import pytest
+from notion_client.errors import APIResponseError
+
+import app
+
+
+def notion_error(status, headers=None):
+    return APIResponseError(
+        code="rate_limited" if status == 429 else "internal_server_error",
+        status=status,
+        message="error",
+        headers=httpx.Headers(headers or {}),
+        raw_body_text="",
+    )
+
+
+def flaky(*failures, result="ok"):
+    calls = []
+
+    def call():
+        calls.append(None)
+        if len(calls) <= len(failures):
+            raise failures[len(calls) - 1]
+        return result
+
+    call.calls = calls
+    return call
+
+
+def test_retries_transient_errors(no_sleep):
+    call = flaky(notion_error(503), TimeoutError("slow"))
+
+    assert app.with_retries(call) == "ok"
+    assert len(call.calls) == 3
+    assert len(no_sleep) == 2
+
+
+def test_gives_up_after_last_attempt(no_sleep):
+    call = flaky(*(notion_error(502) for _ in range(app.RETRY_ATTEMPTS)))
+
+    with pytest.raises(APIResponseError):
+        app.with_retries(call)
+    assert len(call.calls) == app.RETRY_ATTEMPTS
+
+
+def test_does_not_retry_client_errors(no_sleep):
+    call = flaky(notion_error(400))
+
+    with pytest.raises(APIResponseError):
+        app.with_retries(call)
+    assert len(call.calls) == 1
+    assert no_sleep == []
+
+
+def test_retry_if_narrows_what_is_retried(no_sleep):
+    call = flaky(notion_error(503))
+
+    with pytest.raises(APIResponseError):
+        app.with_retries(call, retry_if=app.is_rate_limited)
+
+
+def test_waits_at_least_retry_after(no_sleep):
+    call = flaky(notion_error(429, {"Retry-After": "4"}))
+
+    app.with_retries(call)
+    assert no_sleep == [4.0]
+
+
+def test_retry_after_parsing():
+    assert app.retry_after(notion_error(429, {"Retry-After": "2.5"})) == 2.5
+    assert app.retry_after(notion_error(429, {"Retry-After": "Wed, 21 Oct 2015 07:28:00 GMT"})) is None
+    assert app.retry_after(notion_error(503)) is None
+    assert app.retry_after(ValueError()) is None
+
+
+def test_gives_up_when_retry_after_exceeds_max_delay(no_sleep):
+    call = flaky(notion_error(429, {"Retry-After": "3600"}))
+
+    with pytest.raises(APIResponseError):
+        app.with_retries(call)
+    assert no_sleep == []
+
+
+def test_notion_call_timeout_excludes_throttle_wait(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(app, "_notion_slots", slots)
+    slots.acquire()
+    threading.Timer(0.3, slots.release).start()
+
+    # Queued for 0.3s behind the held slot, but the call itself is instant
+    assert app.notion_call(lambda: "ok", timeout=0.1) == "ok"
+
+
+def test_notion_call_holds_slot_until_request_finishes(monkeypatch):
+    slots = threading.BoundedSemaphore(1)
+    monkeypatch.setattr(app, "_notion_slots", slots)
+    finished = threading.Event()
+
+    def slow():
+        time.sleep(0.3)
+        finished.set()
+
+    with pytest.raises(TimeoutError):
+        app.notion_call(slow, timeout=0.05)
+    assert not slots.acquire(blocking=False)
+    finished.wait(1)
+    time.sleep(0.05)
+    assert slots.acquire(blocking=False)
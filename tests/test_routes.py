@@ -0,0 +1,235 @@
+import types
+
+import orjson
+import pytest
+
+import app
+from conftest import InlineExecutor
+
+
+def sse_events(body):
+    events = []
+    for block in body.decode().strip().split("\n\n"):
+        event, data = block.split("\n")
+        events.append((event.removeprefix("event: "), orjson.loads(data.removeprefix("data: "))))
+    return events
+
+
+SUMMARY_JSON = '{"summary": "The team agreed on the Q3 roadmap.", "action_items": [], "key_questions": []}'
+
+
+def test_jsonify_uses_orjson():
+    with app.app.test_request_context():
+        response = app.jsonify({"b": 1, "a": [1, 2]})
+
+    assert response.mimetype == "application/json"
+    assert response.get_data() == b'{"a":[1,2],"b":1}\n'
+
+
+def test_jsonify_accepts_positional_and_keyword_forms():
+    with app.app.test_request_context():
+        assert app.jsonify(1, 2).get_json() == [1, 2]
+        assert app.jsonify(a=1).get_json() == {"a": 1}
+        assert app.jsonify().get_json() is None
+
+
+@pytest.mark.parametrize("body, status", [
+    ({}, 400),
+    ({"transcript": 5}, 400),
+    ({"transcript": "hi", "meetingName": ["x"]}, 400),
+    ({"transcript": "x" * (app.MAX_TRANSCRIPT_CHARS + 1)}, 413),
+])
+def test_summarize_rejects_bad_input(client, body, status):
+    assert client.post("/summarize", json=body).status_code == status
+
+
+def test_stream_relays_deltas_then_done(client, notion, background, monkeypatch):
+    pieces = [SUMMARY_JSON[:10], SUMMARY_JSON[10:]]
+    monkeypatch.setattr(app, "iter_completion", lambda **kwargs: iter(pieces))
+
+    response = client.post("/summarize/stream", json={"transcript": "Alice: ship it", "meetingName": "Sync"})
+    events = sse_events(response.get_data())
+
+    assert response.mimetype == "text/event-stream"
+    assert [e for e, _ in events] == ["delta", "delta", "done"]
+    assert "".join(d["delta"] for e, d in events if e == "delta") == SUMMARY_JSON
+    assert events[-1][1]["notion_url"].startswith("https://notion.so/")
+
+
+def test_stream_reports_unparseable_reply(client, notion, background, monkeypatch):
+    monkeypatch.setattr(app, "iter_completion", lambda **kwargs: iter(["not json"]))
+    monkeypatch.setattr(app, "request_summary", lambda *args: "still not json")
+
+    events = sse_events(client.post("/summarize/stream", json={"transcript": "hi"}).get_data())
+
+    assert events[-1][0] == "error"
+
+
+class FakeBatches:
+    def __init__(self):
+        self.files = {}
+        self.batch = types.SimpleNamespace(
+            id="batch_1", status="validating", output_file_id=None, error_file_id=None, request_counts=None,
+        )
+        self.create = lambda **kwargs: self.batch
+        self.retrieve = lambda batch_id: self.batch
+
+
+@pytest.fixture
+def openai_batches(monkeypatch):
+    batches = FakeBatches()
+    client = types.SimpleNamespace(
+        batches=batches,
+        files=types.SimpleNamespace(
+            create=lambda file, purpose: types.SimpleNamespace(id="file_in"),
+            content=lambda file_id: types.SimpleNamespace(text=batches.files[file_id]),
+        ),
+    )
+    monkeypatch.setattr(app, "get_openai", lambda: client)
+    monkeypatch.setattr(app, "_batch_jobs", InlineExecutor())
+    return batches
+
+
+def batch_line(index, content):
+    return orjson.dumps({
+        "custom_id": str(index),
+        "response": {"status_code": 200, "body": {"choices": [{"message": {"content": content}}]}},
+    }).decode()
+
+
+def test_batch_round_trip(client, notion, background, openai_batches):
+    response = client.post("/summarize/batch", json={"transcripts": [
+        {"transcript": "first", "meetingName": "One"},
+        {"transcript": "second"},
+    ]})
+    assert response.status_code == 202
+    status_url = response.get_json()["status_url"]
+    assert client.get(status_url).get_json()["status"] == "validating"
+
+    openai_batches.batch.status = "completed"
+    openai_batches.batch.output_file_id = "file_out"
+    openai_batches.files["file_out"] = "\n".join([batch_line(1, "garbage"), batch_line(0, SUMMARY_JSON)])
+    client.get(status_url)
+    body = client.get(status_url).get_json()
+
+    assert body["status"] == "done"
+    assert [r["index"] for r in body["results"]] == [0, 1]
+    assert body["results"][0]["meeting_name"] == "One"
+    assert "notion_url" in body["results"][0]
+    assert body["results"][1]["meeting_name"] == "Untitled Meeting"
+    assert "error" in body["results"][1]
+
+
+def test_batch_rejects_non_object_body(client, openai_batches):
+    response = client.post("/summarize/batch", json=[1])
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "Request body must be a JSON object"}
+
+
+@pytest.mark.parametrize("item", [{"meetingName": "x"}, {"transcript": "hi", "meetingName": 5}])
+def test_batch_rejects_invalid_items(client, openai_batches, item):
+    response = client.post("/summarize/batch", json={"transcripts": [item]})
+
+    assert response.status_code == 400
+
+
+def complete_batch(openai_batches, output=None, errors=None):
+    openai_batches.batch.status = "completed"
+    if output is not None:
+        openai_batches.batch.output_file_id = "file_out"
+        openai_batches.files["file_out"] = "\n".join(output)
+    if errors is not None:
+        openai_batches.batch.error_file_id = "file_err"
+        openai_batches.files["file_err"] = "\n".join(errors)
+
+
+def test_batch_reports_lines_from_the_error_file(client, notion, background, openai_batches):
+    status_url = client.post("/summarize/batch", json={"transcripts": [
+        {"transcript": "first"}, {"transcript": "second"},
+    ]}).get_json()["status_url"]
+    complete_batch(openai_batches, output=[batch_line(0, SUMMARY_JSON)], errors=[orjson.dumps({
+        "custom_id": "1",
+        "response": {"status_code": 400, "body": {"error": {"message": "context length exceeded"}}},
+        "error": None,
+    }).decode()])
+
+    client.get(status_url)
+    results = client.get(status_url).get_json()["results"]
+
+    assert "notion_url" in results[0]
+    assert results[1]["error"] == "context length exceeded"
+
+
+def test_stalled_batch_is_reclaimed_and_resumed(client, notion, background, openai_batches, monkeypatch):
+    status_url = client.post("/summarize/batch", json={"transcripts": [
+        {"transcript": "first"}, {"transcript": "second"},
+    ]}).get_json()["status_url"]
+    complete_batch(openai_batches, output=[batch_line(0, SUMMARY_JSON), batch_line(1, SUMMARY_JSON)])
+    # A worker claimed the batch, saved line 0 and died
+    assert app.claim_batch("batch_1")
+    app.save_batch_results("batch_1", "processing", {0: {"index": 0, "meeting_name": "Untitled Meeting", "notion_url": "u"}})
+    assert client.get(status_url).get_json()["status"] == "processing"
+
+    monkeypatch.setattr(app, "BATCH_STALE_AFTER", -1)
+    client.get(status_url)
+    monkeypatch.setattr(app, "BATCH_STALE_AFTER", 300)
+    body = client.get(status_url).get_json()
+
+    assert body["status"] == "done"
+    assert body["results"][0]["notion_url"] == "u"
+    assert len(notion.pages_by_id) == 1  # Only line 1 created a page
+
+
+def test_long_transcript_runs_as_job(client, monkeypatch):
+    submitted = []
+    monkeypatch.setattr(app, "_jobs", types.SimpleNamespace(submit=lambda *args: submitted.append(args)))
+    transcript = "word " * (app.MAP_REDUCE_MIN_TOKENS * 2)
+
+    response = client.post("/summarize", json={"transcript": transcript})
+
+    assert response.status_code == 202
+    assert response.get_json()["status_url"].startswith("/summarize/status/")
+    assert submitted[0][0] is app.run_summary_job
+
+
+def test_stream_long_transcript_uses_map_reduce(client, notion, background, monkeypatch):
+    monkeypatch.setattr(app, "map_reduce_summary", lambda transcript: SUMMARY_JSON)
+    monkeypatch.setattr(app, "iter_completion", lambda **kwargs: pytest.fail("single-call path used"))
+    transcript = "word " * (app.MAP_REDUCE_MIN_TOKENS * 2)
+
+    events = sse_events(client.post("/summarize/stream", json={"transcript": transcript}).get_data())
+
+    assert [e for e, _ in events] == ["done"]
+
+
+def test_job_status_round_trip(client):
+    app.save_job("job1", "succeeded", {"notion_url": "https://notion.so/p1"})
+
+    assert client.get("/summarize/status/job1").get_json() == {
+        "job_id": "job1", "status": "succeeded", "notion_url": "https://notion.so/p1",
+    }
+    assert client.get("/summarize/status/nope").status_code == 404
+
+
+def test_job_left_running_by_a_dead_worker_reports_failed(client, monkeypatch):
+    app.save_job("job1", "running")
+    assert client.get("/summarize/status/job1").get_json()["status"] == "running"
+
+    monkeypatch.setattr(app, "SUMMARY_JOB_STALE_AFTER", -1)
+    body = client.get("/summarize/status/job1").get_json()
+
+    assert body["status"] == "failed"
+    assert "interrupted" in body["error"]
+
+
+def test_job_waiting_in_the_queue_is_not_reported_failed(client, monkeypatch):
+    app.save_job("job1", "queued")
+    monkeypatch.setattr(app, "SUMMARY_JOB_STALE_AFTER", -1)
+
+    assert client.get("/summarize/status/job1").get_json()["status"] == "queued"
+
+
+def test_jsonify_rejects_mixed_arguments():
+    with app.app.test_request_context(), pytest.raises(TypeError):
+        app.jsonify(1, a=2)
@@ -0,0 +1,208 @@
+import threading
+from array import array
+
+import orjson
+import pytest
+
+import app
+
+
+def test_json_end_scanner_stops_after_top_level_object():
+    scanner = app.JsonEndScanner()
+
+    assert scanner.feed('{"summary": "a {b}') == -1
+    assert scanner.feed('", "items": [{"x": 1}]') == -1
+    assert scanner.feed("}\n\n  ") == 1
+
+
+def test_json_end_scanner_ignores_escaped_quotes():
+    scanner = app.JsonEndScanner()
+
+    assert scanner.feed(r'{"a": "say \"}\" twice"}') == len(r'{"a": "say \"}\" twice"}')
+
+
+def test_iter_completion_closes_stream_at_json_end(monkeypatch):
+    class Stream(list):
+        closed = False
+
+        def close(self):
+            self.closed = True
+
+    def chunk(text):
+        delta = type("Delta", (), {"content": text})
+        return type("Chunk", (), {"choices": [type("Choice", (), {"delta": delta})]})
+
+    stream = Stream(chunk(t) for t in ['{"a": ', '1}  ', "\n\n", "never read"])
+    fake = type("OpenAI", (), {})()
+    fake.chat = type("Chat", (), {})()
+    fake.chat.completions = type("Completions", (), {"create": staticmethod(lambda **kw: stream)})()
+    monkeypatch.setattr(app, "get_openai", lambda: fake)
+
+    assert "".join(app.iter_completion(response_format={"type": "json_object"})) == '{"a": 1}'
+    assert stream.closed
+
+
+def test_preprocess_strips_timestamps_and_whitespace():
+    raw = "[00:01] Alice:   hello\t there \n\n\n\n[1:02:03] Bob: hi  \n"
+
+    assert app.preprocess(raw) == "Alice: hello there\n\nBob: hi"
+
+
+def test_split_transcript_keeps_lines_whole():
+    lines = [f"line {i}\n" for i in range(10)]
+
+    chunks = app.split_transcript("".join(lines), max_chars=20)
+
+    assert "".join(chunks) == "".join(lines)
+    assert all(len(chunk) <= 20 for chunk in chunks)
+    assert all(chunk.endswith("\n") for chunk in chunks)
+
+
+def test_split_transcript_slices_overlong_lines():
+    chunks = app.split_transcript("x" * 45, max_chars=20)
+
+    assert chunks == ["x" * 20, "x" * 20, "x" * 5]
+
+
+def test_summary_cache_round_trip():
+    key = app.summary_cache_key("transcript")
+    assert app.cache_get(key) is None
+
+    app.cache_set(key, {"summary": "s"})
+
+    assert app.cache_get(key) == {"summary": "s"}
+    assert app.summary_cache_key("other transcript") != key
+
+
+def test_semantic_cache_matches_only_above_threshold():
+    namespace = app.semantic_namespace("transcript")
+    app.semantic_store(array("f", [1.0, 0.0]), {"summary": "cached"}, namespace)
+
+    assert app.semantic_lookup(array("f", [1.0, 0.0]), namespace) == {"summary": "cached"}
+    assert app.semantic_lookup(array("f", [0.0, 1.0]), namespace) is None
+    assert app.semantic_lookup(array("f", [1.0, 0.0]), "other|namespace") is None
+
+
+def test_cache_keys_name_the_models_that_produce_the_summary(monkeypatch):
+    short, long = "short transcript", "word " * (app.MAP_REDUCE_MIN_TOKENS * 2)
+    medium = "x" * (app.FAST_MODEL_MAX_TOKENS * 4 + 4)
+    before = {t: (app.summary_cache_key(t), app.semantic_namespace(t)) for t in (short, medium, long)}
+
+    monkeypatch.setattr(app, "FAST_SUMMARY_MODEL", "another-fast-model")
+
+    # Short and map-reduced transcripts go through the fast tier; medium ones don't
+    for transcript in (short, long):
+        assert app.summary_cache_key(transcript) != before[transcript][0]
+        assert app.semantic_namespace(transcript) != before[transcript][1]
+    assert (app.summary_cache_key(medium), app.semantic_namespace(medium)) == before[medium]
+
+
+def test_batcher_fuses_concurrent_transcripts(monkeypatch):
+    prompts = []
+
+    def request_summary(model, transcript, system_prompt):
+        prompts.append(transcript)
+        count = transcript.count("### Transcript")
+        return orjson.dumps({"summaries": [{"summary": f"s{i}"} for i in range(count)]}).decode()
+
+    monkeypatch.setattr(app, "request_summary", request_summary)
+    batcher = app.SummaryBatcher(0.2, 2, "model")
+    results = {}
+    threads = [
+        threading.Thread(target=lambda t=t: results.__setitem__(t, batcher.summarize(t, timeout=5)))
+        for t in ("first", "second")
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(prompts) == 1
+    assert sorted(orjson.loads(r)["summary"] for r in results.values()) == ["s0", "s1"]
+
+
+def test_batcher_leaves_lone_transcript_to_caller(monkeypatch):
+    monkeypatch.setattr(app, "request_summary", lambda *args: "unused")
+    batcher = app.SummaryBatcher(0.01, 5, "model")
+
+    assert batcher.summarize("alone", timeout=5) is None
+
+
+def test_batcher_falls_back_on_mismatched_reply(monkeypatch):
+    monkeypatch.setattr(app, "request_summary", lambda *args: '{"summaries": []}')
+    batcher = app.SummaryBatcher(0.2, 2, "model")
+    results = []
+    threads = [threading.Thread(target=lambda t=t: results.append(batcher.summarize(t, timeout=5))) for t in "ab"]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == [None, None]
+
+
+def test_map_reduce_drops_failed_sections(monkeypatch):
+    merged = []
+
+    def request_summary(model, transcript, system_prompt=app.SYSTEM_PROMPT):
+        if system_prompt == app.REDUCE_SYSTEM_PROMPT:
+            merged.append(orjson.loads(transcript))
+            return '{"summary": "merged"}'
+        if transcript.startswith("bad"):
+            raise TimeoutError("slow section")
+        return orjson.dumps({"summary": transcript.strip()}).decode()
+
+    monkeypatch.setattr(app, "request_summary", request_summary)
+    monkeypatch.setattr(app, "split_transcript", lambda t: t.split("|"))
+
+    assert app.map_reduce_summary("one|bad|three") == '{"summary": "merged"}'
+    assert merged == [[{"summary": "one"}, {"summary": "three"}]]
+
+
+def test_map_reduce_drops_sections_past_deadline(monkeypatch):
+    release = threading.Event()
+
+    def request_summary(model, transcript, system_prompt=app.SYSTEM_PROMPT):
+        if transcript == "slow":
+            release.wait(5)
+        return orjson.dumps({"summary": transcript}).decode()
+
+    monkeypatch.setattr(app, "request_summary", request_summary)
+    monkeypatch.setattr(app, "split_transcript", lambda t: t.split("|"))
+    monkeypatch.setattr(app, "MAP_REDUCE_TIMEOUT", 0.2)
+    try:
+        reply = app.map_reduce_summary("fast|slow")
+    finally:
+        release.set()
+
+    assert orjson.loads(reply) == {"summary": '[{"summary":"fast"}]'}
+
+
+def test_map_reduce_reraises_when_every_section_fails(monkeypatch):
+    def request_summary(model, transcript, system_prompt=app.SYSTEM_PROMPT):
+        raise app.ServiceBusyError("busy")
+
+    monkeypatch.setattr(app, "request_summary", request_summary)
+    monkeypatch.setattr(app, "split_transcript", lambda t: t.split("|"))
+
+    with pytest.raises(app.ServiceBusyError):
+        app.map_reduce_summary("a|b")
+
+
+def test_batcher_dispatches_on_a_bounded_pool(monkeypatch):
+    threads = set()
+
+    def request_summary(model, transcript, system_prompt):
+        threads.add(threading.current_thread().name)
+        count = transcript.count("### Transcript")
+        return orjson.dumps({"summaries": [{"summary": "s"}] * count}).decode()
+
+    monkeypatch.setattr(app, "request_summary", request_summary)
+    batcher = app.SummaryBatcher(0.05, 2, "model", max_in_flight=1)
+    callers = [threading.Thread(target=batcher.summarize, args=(str(i),)) for i in range(6)]
+    for caller in callers:
+        caller.start()
+    for caller in callers:
+        caller.join()
+
+    assert len(threads) == 1 and threads.pop().startswith("summary-batch")
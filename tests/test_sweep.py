@@ -0,0 +1,200 @@
+import sqlite3
+import threading
+import time
+
+import app
+
+
+def sweep():
+    with app.app.app_context():
+        return app.run_email_sweep()
+
+
+def test_sweep_emails_each_unsent_page_once(notion, outbox, background):
+    notion.add("p1")
+    notion.add("p2")
+
+    assert sweep()["message"] == "Processed 2 unsent meeting summaries."
+    background.drain()
+
+    assert len(outbox) == 2
+    assert sorted(notion.updates) == ["p1", "p2"]
+
+
+def test_sweep_skips_pages_without_content(notion, outbox, background):
+    notion.add("p1", name="")
+    notion.add("p2", summary="")
+
+    assert sweep()["message"] == "Processed 0 unsent meeting summaries."
+    assert outbox == []
+
+
+def test_overlapping_sweep_skips_claimed_pages(notion, outbox, background):
+    notion.add("p1")
+    sweep()
+    # The first sweep's Sent update hasn't run yet, so Notion still says unsent
+    with app.app.app_context():
+        app.cache.delete_memoized(app.query_unsent_pages, app.notion_database_id)
+
+    assert sweep()["message"] == "Processed 0 unsent meeting summaries."
+    assert len(outbox) == 1
+
+
+def test_failed_email_releases_claim(notion, monkeypatch, background):
+    notion.add("p1")
+    monkeypatch.setattr(app, "send_email_via_mailtrap", lambda *args: (False, "down"))
+
+    sweep()
+
+    assert app.claim_pages([{"id": "p1"}]) == [{"id": "p1"}]
+
+
+def test_claim_pages_is_exclusive():
+    pages = [{"id": "p1"}, {"id": "p2"}]
+
+    assert app.claim_pages(pages) == pages
+    assert app.claim_pages(pages) == []
+    app.release_page("p1")
+    assert app.claim_pages(pages) == [{"id": "p1"}]
+
+
+def test_claim_held_by_another_worker_is_respected():
+    other = sqlite3.connect(app.SUMMARY_CACHE_PATH)
+    with other:
+        other.execute("INSERT INTO page_claims VALUES ('p1', ?)", (time.time(),))
+
+    assert app.claim_pages([{"id": "p1"}, {"id": "p2"}]) == [{"id": "p2"}]
+    assert "p1" not in app._in_flight_pages
+
+
+def test_stale_claim_lapses():
+    other = sqlite3.connect(app.SUMMARY_CACHE_PATH)
+    with other:
+        other.execute("INSERT INTO page_claims VALUES ('p1', ?)", (time.time() - app.PAGE_CLAIM_TTL - 1,))
+
+    assert app.claim_shared(["p1"]) == {"p1"}
+
+
+def test_stale_query_result_never_resends(notion, outbox, background):
+    # Another worker's cached query keeps listing the page as unsent after
+    # the first sweep has emailed and flagged it
+    notion.add("p1")
+    notion.stale = True
+
+    sweep()
+    background.drain()
+    for _ in range(2):
+        with app.app.app_context():
+            app.cache.delete_memoized(app.query_unsent_pages, app.notion_database_id)
+        sweep()
+        background.drain()
+
+    assert len(outbox) == 1
+    assert notion.updates == ["p1"]
+
+
+def test_sweep_between_send_and_flag_does_not_resend(notion, outbox, background):
+    notion.add("p1")
+
+    sweep()  # Emails p1; the Sent write is still queued
+    with app.app.app_context():
+        app.cache.delete_memoized(app.query_unsent_pages, app.notion_database_id)
+    sweep()  # Re-queries and caches p1 as unsent
+    background.drain()
+    sweep()  # Reads the cached result from before the flag
+
+    assert len(outbox) == 1
+
+
+def test_memo_is_dropped_after_the_flag_is_written(notion, outbox, background):
+    notion.add("p1")
+
+    sweep()
+    sweep()
+    assert notion.queries == 1  # Flag still pending, so the memo stands
+
+    background.drain()
+    sweep()
+    assert notion.queries == 2
+
+
+def test_failed_flag_is_retried_without_resending(notion, outbox, background, no_sleep):
+    notion.add("p1")
+    update = notion.pages.update
+    notion.pages.update = lambda **kwargs: (_ for _ in ()).throw(TimeoutError("slow"))
+    sweep()
+    background.drain()
+    assert notion.sent == set()
+
+    notion.pages.update = update
+    with app.app.app_context():
+        app.cache.delete_memoized(app.query_unsent_pages, app.notion_database_id)
+    assert sweep()["message"] == "Processed 0 unsent meeting summaries."
+    background.drain()
+
+    assert len(outbox) == 1
+    assert notion.sent == {"p1"}
+    assert app.emailed_pages(["p1"]) == {"p1": True}
+
+
+def test_emailed_records_expire(monkeypatch):
+    app.remember_emailed("p1")
+    assert app.emailed_pages(["p1", "p2"]) == {"p1": False}
+
+    app.remember_flagged("p1")
+    assert app.emailed_pages(["p1"]) == {"p1": True}
+
+    monkeypatch.setattr(app, "EMAILED_PAGE_TTL", -1)
+    assert app.emailed_pages(["p1"]) == {}
+
+
+def store(notion):
+    with app.app.app_context():
+        return app.store_summary({"summary": "Agreed on the roadmap", "action_items": [], "key_questions": []}, "Sync")
+
+
+def test_summarize_email_and_sweep_send_once(notion, outbox, background):
+    store(notion)
+
+    sweep()  # Runs before the /summarize email job
+    background.drain()
+
+    assert len(outbox) == 1
+    assert len(notion.updates) == 1
+
+
+def test_sweep_skips_page_claimed_by_summarize_email(notion, outbox, background, monkeypatch):
+    store(notion)
+    (job, args, kwargs), = background.pending
+
+    def send_during_sweep(*email):
+        assert sweep()["message"] == "Processed 0 unsent meeting summaries."
+        return True, "sent"
+
+    monkeypatch.setattr(app, "send_email_via_mailtrap", send_during_sweep)
+    job(*args, **kwargs)
+    background.drain()
+
+    assert notion.updates == [args[-1]]
+
+
+def test_async_sweeps_queue_at_most_one_behind_the_running_one(client, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    runs = []
+
+    def run_email_sweep_job():
+        runs.append(None)
+        started.set()
+        release.wait(5)
+
+    monkeypatch.setattr(app, "run_email_sweep_job", run_email_sweep_job)
+    try:
+        assert client.post("/api/email-notion-summary?async=1").get_json() == {"status": "queued"}
+        started.wait(5)
+        statuses = [client.post("/api/email-notion-summary?async=1").get_json()["status"] for _ in range(3)]
+    finally:
+        release.set()
+    app._queued_sweep.result(5)
+
+    assert statuses == ["queued", "already_queued", "already_queued"]
+    assert len(runs) == 2